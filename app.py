@@ -1,43 +1,69 @@
-from flask import Flask, render_template
+from flask import Flask, jsonify, render_template, request
+from flask_socketio import join_room
 from src.socketio_setup import app, socketio
 from random import randint
 import eventlet # eventlet is an asynchronous framework that works with Flask-SocketIO
-from src.logic import test_function
+from src.logic import build_reports_in_background, test_function
 from src.entities.player import HumanPlayer
+from src.sessions import SessionManager
 from src.statistics_logger import StatisticsLogger
+from src import timings
+
+# Each connection plays on its own table.
+sessions: SessionManager = SessionManager()
+
+# The stored games are loaded (and migrated) before serving, so the first
+# round or report doesn't do it in the eventlet hub.
+StatisticsLogger.get_logger()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# Timings of the rounds and handlers (only recorded with BLACKJACK_TIMINGS=1).
+@app.route('/timings')
+def get_timings():
+    return jsonify(timings.get_report())
+
+@socketio.on('request-snapshot')
+@timings.timed_function('socketio.request-snapshot')
+def request_snapshot(data: dict):
+    session = sessions.find_session(request.sid)
+    if session is not None:
+        socketio.emit('render-snapshot', session.renderer.get_snapshot(), to=request.sid)
+
+@socketio.on('disconnect')
+@timings.timed_function('socketio.disconnect')
+def disconnect(reason=None):
+    sessions.close_session(request.sid)
+
 @socketio.on('start-test')
+@timings.timed_function('socketio.start-test')
 def start_test(data : dict):
     print('Starting test')
     print(data)
-    test_function()
-
-@socketio.on('generate-wins-report')
-def generate_wins_report(data: dict):
-    logger: StatisticsLogger = StatisticsLogger.get_logger()
-    win_percentages: list[float] = logger.get_win_percentage()
-    socketio.emit('receive-wins-report', {'win_percentages': win_percentages})
-
-@socketio.on('generate-decisions-report')
-def generate_decisions_report(data: dict):
-    logger: StatisticsLogger = StatisticsLogger.get_logger()
-    success_percentages: list[float] = logger.get_success_percentage()
-    socketio.emit('receive-decisions-report', {'success_percentages': success_percentages})
-
-@socketio.on('generate-stand-report')
-def generate_stand_report(data: dict):
-    logger: StatisticsLogger = StatisticsLogger.get_logger()
-    stand_values: list[list[int]] = logger.get_stand_values()
-    socketio.emit('receive-stand-report', {
-        'croupier': stand_values[0],
-        'ai1': stand_values[1],
-        'ai2': stand_values[2],
-        'human': stand_values[3],
-    })
+    # The table is only created when the connection starts playing.
+    session = sessions.find_session(request.sid)
+    if session is None:
+        session = sessions.get_session(request.sid)
+        join_room(session.room)
+        # The page gets the cards table and the empty table first.
+        socketio.emit('render-snapshot', session.renderer.get_snapshot(), to=request.sid)
+    test_function(session, bool(data.get('turbo')))
+
+@socketio.on('player-move')
+@timings.timed_function('socketio.player-move')
+def player_move(data: dict):
+    session = sessions.find_session(request.sid)
+    if session is not None:
+        session.receive_move(data.get('move'))
+
+@socketio.on('generate-reports')
+@timings.timed_function('socketio.generate-reports')
+def generate_reports(data: dict):
+    # The reports are sent back as the acknowledgement of the request, as
+    # JSON encoded in a thread, so only this handler waits for them.
+    return build_reports_in_background()
 
 if __name__ == '__main__':
     socketio.run(app, debug=True)
\ No newline at end of file
@@ -0,0 +1,244 @@
+'''
+Vectorised Q-learning of many AI agents at once, for hyper-parameter
+studies. The qtables of K agents are kept in one (K, 32, 2) array (same
+layout as AiPlayer.qtable) and each step advances one hand per agent with
+numpy: epsilon-greedy actions (like AiPlayer.get_ql_action), the rewards
+of AiPlayer.get_reward and the Q-learning update of
+AiPlayer.update_qvalue. When a hand ends (stand or bust) a new one is dealt
+to that agent.
+Only the Q-learning part of the AI is trained (the probabilistic part
+doesn't learn), and the cards are drawn from an infinite shoe: the states
+are just hand values, so the composition of the shoe doesn't matter here.
+Usage (from the project root):
+python -m src.batch_training --steps 100000 --agents-per-config 8 \
+    --learning-rates 0.1 0.5 0.75 --discount-factors 0.5 0.75
+'''
+
+from typing import Any
+import argparse
+import itertools
+import time
+import numpy as np
+
+
+# Same states and actions as AiPlayer.qtable.
+STATES: int = 32
+HIT: int = 0
+STAND: int = 1
+
+# Card values (aces are 11) and their probabilities in a shoe.
+CARD_VALUES: np.ndarray = np.array([2, 3, 4, 5, 6, 7, 8, 9, 10, 11])
+CARD_PROBABILITIES: np.ndarray = \
+    np.array([4, 4, 4, 4, 4, 4, 4, 4, 16, 4]) / 52
+
+
+class BatchQLearner:
+    '''
+    Trains the qtables of K agents at once. The hyper-parameters can be
+    given per agent (arrays of size K) or shared (a number).
+    '''
+
+    def __init__(
+        self,
+        agents: int,
+        learning_rate: Any = 0.75,
+        discount_factor: Any = 0.75,
+        exploration_probability: Any = 0.25,
+        seed: int = 0,
+        qtables: np.ndarray = None
+    ) -> None:
+        self.agents: int = agents
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.qtables: np.ndarray = np.zeros((agents, STATES, 2)) \
+            if qtables is None else np.array(qtables, dtype=float)
+        self.learning_rate: np.ndarray = \
+            np.broadcast_to(np.asarray(learning_rate, dtype=float), (agents,))
+        self.discount_factor: np.ndarray = \
+            np.broadcast_to(np.asarray(discount_factor, dtype=float), (agents,))
+        self.exploration_probability: np.ndarray = np.broadcast_to(
+            np.asarray(exploration_probability, dtype=float), (agents,)
+        )
+
+        # Hand of each agent: value and if it's soft (an ace counts as 11).
+        self.hand_values: np.ndarray = np.zeros(agents, np.int64)
+        self.soft: np.ndarray = np.zeros(agents, bool)
+        self.agent_ids: np.ndarray = np.arange(agents)
+        self.hands_played: int = 0
+        self.deal(np.ones(agents, bool))
+
+    def draw(self, amount: int) -> np.ndarray:
+        '''
+        Returns the values of the given amount of random cards.
+        '''
+
+        return self.rng.choice(CARD_VALUES, amount, p=CARD_PROBABILITIES)
+
+    def add_cards(self, mask: np.ndarray, values: np.ndarray) -> None:
+        '''
+        Adds a card of the given values to the hands selected by the mask
+        (same rules as probability.add_card_to_state).
+        '''
+
+        total: np.ndarray = self.hand_values[mask] + values
+        soft: np.ndarray = self.soft[mask]
+        aces: np.ndarray = values == 11
+        # A new ace counts as 1 if it would go over 21.
+        ace_as_one: np.ndarray = aces & (total > 21)
+        total -= 10 * ace_as_one
+        soft |= aces & ~ace_as_one
+        # A soft hand over 21 counts its ace as 1.
+        softened: np.ndarray = soft & (total > 21)
+        total -= 10 * softened
+        soft &= ~softened
+        self.hand_values[mask] = total
+        self.soft[mask] = soft
+
+    def deal(self, mask: np.ndarray) -> None:
+        '''
+        Deals a new hand of two cards to the agents selected by the mask.
+        '''
+
+        amount: int = int(np.count_nonzero(mask))
+        self.hand_values[mask] = 0
+        self.soft[mask] = False
+        self.add_cards(mask, self.draw(amount))
+        self.add_cards(mask, self.draw(amount))
+
+    def get_actions(self, states: np.ndarray) -> np.ndarray:
+        '''
+        Returns the epsilon-greedy action of each agent (see
+        AiPlayer.get_ql_action): random with the exploration probability,
+        otherwise hit only if its qvalue is greater.
+        '''
+
+        qvalues: np.ndarray = self.qtables[self.agent_ids, states]
+        greedy: np.ndarray = \
+            np.where(qvalues[:, HIT] > qvalues[:, STAND], HIT, STAND)
+        explore: np.ndarray = \
+            self.rng.random(self.agents) < self.exploration_probability
+        random_actions: np.ndarray = self.rng.integers(0, 2, self.agents)
+        return np.where(explore, random_actions, greedy)
+
+    @staticmethod
+    def get_rewards(states: np.ndarray, next_states: np.ndarray) -> np.ndarray:
+        '''
+        Returns the reward of each state change (see AiPlayer.get_reward).
+        '''
+
+        return np.select(
+            [next_states == 21, next_states > 21, next_states > states],
+            [1.0, -0.25, 0.25],
+            0.0
+        )
+
+    def step(self) -> None:
+        '''
+        Makes a move in the hand of every agent and learns from it.
+        '''
+
+        states: np.ndarray = self.hand_values.copy()
+        actions: np.ndarray = self.get_actions(states)
+        hits: np.ndarray = actions == HIT
+        self.add_cards(hits, self.draw(int(np.count_nonzero(hits))))
+        next_states: np.ndarray = self.hand_values
+
+        # Q-learning update (see AiPlayer.update_qvalue).
+        rewards: np.ndarray = self.get_rewards(states, next_states)
+        qvalues: np.ndarray = self.qtables[self.agent_ids, states, actions]
+        best_next_qvalues: np.ndarray = \
+            self.qtables[self.agent_ids, next_states].max(axis=1)
+        self.qtables[self.agent_ids, states, actions] = qvalues \
+            + self.learning_rate * (
+                rewards + self.discount_factor * best_next_qvalues - qvalues
+            )
+
+        finished: np.ndarray = ~hits | (next_states > 21)
+        self.hands_played += int(np.count_nonzero(finished))
+        self.deal(finished)
+
+    def train(self, steps: int) -> None:
+        '''
+        Makes the given amount of steps.
+        '''
+
+        for _ in range(steps):
+            self.step()
+
+    def evaluate(self, hands: int = 10000) -> dict[str, np.ndarray]:
+        '''
+        Plays the given amount of hands per agent with the greedy policy
+        (no exploration and no learning). Returns, per agent, the bust rate
+        and the mean value of the hands that didn't bust.
+        '''
+
+        evaluator: BatchQLearner = BatchQLearner(
+            self.agents, exploration_probability=0,
+            seed=int(self.rng.integers(2 ** 32)), qtables=self.qtables
+        )
+        busts: np.ndarray = np.zeros(self.agents)
+        values: np.ndarray = np.zeros(self.agents)
+        finished_hands: np.ndarray = np.zeros(self.agents)
+        while finished_hands.min() < hands:
+            states: np.ndarray = evaluator.hand_values.copy()
+            hits: np.ndarray = evaluator.get_actions(states) == HIT
+            evaluator.add_cards(hits, evaluator.draw(int(np.count_nonzero(hits))))
+            busted: np.ndarray = evaluator.hand_values > 21
+            finished: np.ndarray = (~hits | busted) & (finished_hands < hands)
+            busts += finished & busted
+            values += np.where(finished & ~busted, evaluator.hand_values, 0)
+            finished_hands += finished
+            evaluator.deal(~hits | busted)
+        return {
+            'bust_rate': busts / hands,
+            'mean_value': values / np.maximum(hands - busts, 1),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Trains many Q-learning agents at once.'
+    )
+    parser.add_argument('--steps', type=int, default=100000)
+    parser.add_argument('--agents-per-config', type=int, default=8)
+    parser.add_argument('--learning-rates', type=float, nargs='+',
+                        default=[0.75])
+    parser.add_argument('--discount-factors', type=float, nargs='+',
+                        default=[0.75])
+    parser.add_argument('--exploration-probabilities', type=float, nargs='+',
+                        default=[0.25])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output', metavar='FILE',
+        help='save the (K, 32, 2) qtables to this .npy file'
+    )
+    args = parser.parse_args()
+
+    configs: list[tuple[float, float, float]] = list(itertools.product(
+        args.learning_rates, args.discount_factors,
+        args.exploration_probabilities
+    ))
+    per_config: int = args.agents_per_config
+    learner: BatchQLearner = BatchQLearner(
+        len(configs) * per_config,
+        np.repeat([config[0] for config in configs], per_config),
+        np.repeat([config[1] for config in configs], per_config),
+        np.repeat([config[2] for config in configs], per_config),
+        args.seed
+    )
+
+    start: float = time.perf_counter()
+    learner.train(args.steps)
+    elapsed: float = time.perf_counter() - start
+    print(f'{learner.agents} agents, {args.steps} steps in {elapsed:.2f} s '
+          f'({learner.agents * args.steps / elapsed:.0f} decisions/s, '
+          f'{learner.hands_played} hands)')
+
+    results: dict[str, np.ndarray] = learner.evaluate()
+    for i, (learning_rate, discount_factor, exploration) in enumerate(configs):
+        agents: slice = slice(i * per_config, (i + 1) * per_config)
+        print(f'lr {learning_rate:<5} df {discount_factor:<5} '
+              f'eps {exploration:<5} '
+              f"bust rate {results['bust_rate'][agents].mean():.3f}  "
+              f"mean value {results['mean_value'][agents].mean():.2f}")
+    if args.output:
+        np.save(args.output, learner.qtables)
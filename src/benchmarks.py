@@ -0,0 +1,309 @@
+'''
+Benchmarks of the hot paths of the game: the deck, the hand values and
+probabilities, the AI moves, storing games, the reports and whole headless
+rounds. Each benchmark reports the operations per second and the latency
+percentiles of a call, as JSON, so the results of two commits can be
+compared.
+Everything is seeded (each benchmark has its own generator), and the
+benchmarks run in a temporary directory with generated fixtures (a legacy
+games.json and a shoe with some cards drawn), so the games and qtables of
+the project are neither used nor modified.
+Usage (from the project root):
+python -m src.benchmarks --size small
+python -m src.benchmarks --size large --output large.json
+'''
+
+from typing import Any, Callable
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from .entities.deck import Deck
+from .entities.player import AiPlayer, Crupier, HumanPlayer
+from .game_engine import GameEngine
+from .statistics_logger import (
+    ENTITIES, LEGACY_GAMES_FILE, Game, StatisticsLogger
+)
+
+
+# Games in the games.json fixture and cards drawn from the shoe per size.
+FIXTURES: dict[str, dict[str, int]] = {
+    'small': {'games': 1000, 'cards_drawn': 0, 'rounds': 200},
+    'medium': {'games': 10000, 'cards_drawn': 150, 'rounds': 1000},
+    'large': {'games': 100000, 'cards_drawn': 250, 'rounds': 5000},
+}
+
+# Latency percentiles reported.
+PERCENTILES: tuple[int, ...] = (50, 90, 99)
+
+
+def measure(
+    function: Callable[[Any], Any],
+    setup: Callable[[], Any] = None,
+    samples: int = 200,
+    calls: int = 100
+) -> dict[str, float]:
+    '''
+    Times samples batches of calls to function, which receives the result of
+    setup (called before each batch, untimed). Returns the operations per
+    second and the latency percentiles of a call, in microseconds.
+    '''
+
+    latencies: list[float] = []
+    total: float = 0
+    for _ in range(samples):
+        argument: Any = setup() if setup else None
+        start: int = time.perf_counter_ns()
+        for _ in range(calls):
+            function(argument)
+        elapsed: int = time.perf_counter_ns() - start
+        total += elapsed
+        latencies.append(elapsed / calls / 1000)
+
+    result: dict[str, float] = {
+        'calls': samples * calls,
+        'ops_per_sec': samples * calls / (total / 1e9),
+    }
+    for percentile in PERCENTILES:
+        result[f'p{percentile}_us'] = \
+            float(np.percentile(latencies, percentile))
+    return result
+
+
+def generate_game(rng: random.Random) -> dict[str, Any]:
+    '''
+    Returns a plausible game (in the StatisticsLogger format): each entity
+    hits until it goes over a random threshold and then stands, if it
+    didn't bust.
+    '''
+
+    game: dict[str, Any] = {'winners': []}
+    best: dict[str, int] = {}
+    for entity in ENTITIES:
+        moves: list[Any] = []
+        value: int = rng.randint(4, 21)
+        threshold: int = rng.randint(12, 18)
+        while value < threshold:
+            value += rng.randint(2, 11)
+            moves += ['H', value]
+        if value <= 21:
+            moves += ['S', value]
+            best[entity] = value
+        game[f'{entity}_moves'] = moves
+    croupier: int = best.get('croupier', 0)
+    winners: list[str] = \
+        [entity for entity in ENTITIES[1:] if best.get(entity, 0) > croupier]
+    game['winners'] = winners if winners else ['croupier']
+    return game
+
+
+def write_games_fixture(games: int, seed: int) -> list[dict[str, Any]]:
+    '''
+    Writes the given amount of generated games to the legacy games.json of
+    the working directory, which the StatisticsLogger migrates when loaded.
+    Returns the games.
+    '''
+
+    rng: random.Random = random.Random(seed)
+    fixture: list[dict[str, Any]] = [generate_game(rng) for _ in range(games)]
+    os.makedirs(os.path.dirname(LEGACY_GAMES_FILE), exist_ok=True)
+    with open(LEGACY_GAMES_FILE, 'w', encoding='utf-8') as file:
+        json.dump(fixture, file)
+    return fixture
+
+
+def get_shoe_fixture(cards_drawn: int, seed: int) -> Deck:
+    '''
+    Returns a shoe with the given amount of cards drawn.
+    '''
+
+    deck: Deck = Deck(np.random.default_rng(seed))
+    for _ in range(cards_drawn):
+        deck.get_random_card()
+    return deck
+
+
+def benchmark_deck(shoe: Deck, seed: int) -> dict[str, dict[str, float]]:
+    '''
+    Benchmarks the draws and copies of the deck.
+    '''
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    draws: int = min(50, len(shoe) - 2)
+    return {
+        'Deck.get_random_card': measure(
+            lambda deck: deck.get_random_card(), lambda: shoe.copy(rng),
+            calls=draws
+        ),
+        'Deck.copy': measure(lambda _: shoe.copy()),
+    }
+
+
+def benchmark_player(shoe: Deck, seed: int) -> dict[str, dict[str, float]]:
+    '''
+    Benchmarks the hand value and the hit probability of a three cards hand.
+    '''
+
+    player: HumanPlayer = HumanPlayer()
+    player.verbose = False
+    player.deck = shoe.copy(np.random.default_rng(seed))
+    for _ in range(3):
+        player.add_card_to_hand()
+    return {
+        'Player.get_hand_value': measure(lambda _: player.get_hand_value()),
+        'Player.calculate_hit_probability':
+            measure(lambda _: player.calculate_hit_probability()),
+    }
+
+
+def benchmark_ai_move(shoe: Deck, seed: int) -> dict[str, dict[str, float]]:
+    '''
+    Benchmarks a move of an AI player from a fresh two cards hand, with the
+    croupier showing a card.
+    '''
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    ai_player: AiPlayer = AiPlayer('ai1', rng)
+    crupier: Crupier = Crupier()
+    ai_player.crupier = crupier
+    for player in (ai_player, crupier):
+        player.verbose = False
+
+    def setup() -> AiPlayer:
+        deck: Deck = shoe.copy(rng)
+        for player in (ai_player, crupier):
+            player.reset()
+            player.deck = deck
+            player.game_record = Game()
+            player.add_card_to_hand()
+            player.add_card_to_hand()
+        return ai_player
+
+    return {
+        'AiPlayer.make_move':
+            measure(lambda player: player.make_move(), setup, calls=1),
+    }
+
+
+def benchmark_logger(
+    games: list[dict[str, Any]], seed: int
+) -> dict[str, dict[str, float]]:
+    '''
+    Benchmarks storing a game and the reports, with the fixture games loaded.
+    '''
+
+    logger: StatisticsLogger = StatisticsLogger()
+    rng: random.Random = random.Random(seed)
+
+    def setup() -> StatisticsLogger:
+        game: Game = Game()
+        for key, value in generate_game(rng).items():
+            setattr(game, key, value)
+        logger.current_game = game
+        return logger
+
+    return {
+        'StatisticsLogger.store_data':
+            measure(lambda logger: logger.store_data(), setup, calls=1),
+        'StatisticsLogger.get_win_percentage':
+            measure(lambda _: logger.get_win_percentage()),
+        'StatisticsLogger.get_success_percentage':
+            measure(lambda _: logger.get_success_percentage()),
+        'StatisticsLogger.get_stand_values':
+            measure(lambda _: logger.get_stand_values()),
+    }
+
+
+def benchmark_rounds(
+    shoe: Deck, rounds: int, seed: int
+) -> dict[str, dict[str, float]]:
+    '''
+    Benchmarks whole headless rounds (see GameEngine), not kept in the logger.
+    '''
+
+    engine: GameEngine = GameEngine(seed=seed)
+    engine.deck = shoe.copy(engine.rng)
+    for player in engine.players + [engine.crupier]:
+        player.deck = engine.deck
+    return {
+        'GameEngine.play_round': measure(
+            lambda engine: engine.play_round(store=False, keep=False),
+            lambda: engine, samples=rounds, calls=1
+        ),
+    }
+
+
+def get_commit() -> str | None:
+    '''
+    Returns the current git commit, if available.
+    '''
+
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(size: str, seed: int = 0) -> dict[str, Any]:
+    '''
+    Runs all the benchmarks with the fixtures of the given size, in a
+    temporary directory. Returns the results with some context.
+    '''
+
+    fixture: dict[str, int] = FIXTURES[size]
+    commit: str | None = get_commit()
+    results: dict[str, dict[str, float]] = {}
+    working_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        StatisticsLogger.instance = None
+        try:
+            games: list[dict[str, Any]] = \
+                write_games_fixture(fixture['games'], seed)
+            shoe: Deck = get_shoe_fixture(fixture['cards_drawn'], seed)
+            results.update(benchmark_deck(shoe, seed))
+            results.update(benchmark_player(shoe, seed))
+            results.update(benchmark_ai_move(shoe, seed))
+            results.update(benchmark_logger(games, seed))
+            results.update(benchmark_rounds(shoe, fixture['rounds'], seed))
+        finally:
+            StatisticsLogger.instance = None
+            os.chdir(working_directory)
+
+    return {
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'size': size,
+        'seed': seed,
+        'fixture': fixture,
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the game.')
+    parser.add_argument('--size', choices=list(FIXTURES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output', metavar='FILE',
+        help='write the JSON results to this file instead of printing them'
+    )
+    args = parser.parse_args()
+
+    report: dict[str, Any] = run_benchmarks(args.size, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        for name, result in report['results'].items():
+            print(f"{name:42} {result['ops_per_sec']:>14.1f} ops/s  "
+                  f"p50 {result['p50_us']:.2f} us  p99 {result['p99_us']:.2f} us")
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,241 @@
+'''
+Columnar store of games, for analytics over millions of games.
+Instead of a dictionary with four lists per game (see StatisticsLogger),
+the games are kept in a few numpy arrays, each one saved as a raw binary
+file that grows by appending and is read with np.memmap, so the games
+never need to be loaded as Python objects:
+- moves.bin: one row per move with the entity (index in ENTITIES), the
+  move (0 is hit, 1 is stand) and the hand value after the move. The moves
+  of a game are consecutive and in order.
+- game_ends.bin: for each game, the position in moves.bin after its last
+  move. The moves of game i go from game_ends[i - 1] to game_ends[i].
+- winners.bin: for each game, a bitmask of winners (bit i is ENTITIES[i]).
+The three reports of StatisticsLogger are implemented with numpy.
+Usage (from the project root):
+python -m src.columnar_store import   (copies the games of the game log)
+python -m src.columnar_store report
+'''
+
+from typing import Any
+import argparse
+import os
+import numpy as np
+from .statistics_logger import ENTITIES, GameLog
+
+
+COLUMNAR_DIRECTORY: str = './static/columnar_games'
+
+MOVE_DTYPE = np.dtype(
+    [('entity', np.uint8), ('move', np.uint8), ('value', np.uint8)]
+)
+GAME_END_DTYPE = np.dtype(np.int64)
+WINNERS_DTYPE = np.dtype(np.uint8)
+
+HIT: int = 0
+STAND: int = 1
+
+
+class ColumnarGameStore:
+    '''
+    Games stored by columns in a directory (see the module description).
+    '''
+
+    def __init__(self, directory: str = COLUMNAR_DIRECTORY) -> None:
+        self.directory: str = directory
+        os.makedirs(directory, exist_ok=True)
+        self.moves_path: str = os.path.join(directory, 'moves.bin')
+        self.game_ends_path: str = os.path.join(directory, 'game_ends.bin')
+        self.winners_path: str = os.path.join(directory, 'winners.bin')
+
+    @staticmethod
+    def open_column(path: str, dtype: np.dtype) -> np.ndarray:
+        '''
+        Returns the column in the given file, memory mapped (read-only).
+        '''
+
+        if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+            return np.empty(0, dtype)  # np.memmap can't map empty files.
+        length: int = os.path.getsize(path) // dtype.itemsize
+        return np.memmap(path, dtype, mode='r', shape=(length,))
+
+    def open(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Returns the moves, game ends and winners columns. Only complete games
+        are included, in case the last append was interrupted.
+        '''
+
+        moves: np.ndarray = self.open_column(self.moves_path, MOVE_DTYPE)
+        game_ends: np.ndarray = \
+            self.open_column(self.game_ends_path, GAME_END_DTYPE)
+        winners: np.ndarray = self.open_column(self.winners_path, WINNERS_DTYPE)
+
+        total_games: int = min(len(game_ends), len(winners))
+        game_ends = game_ends[:total_games]
+        winners = winners[:total_games]
+        moves = moves[:game_ends[-1] if total_games > 0 else 0]
+        return moves, game_ends, winners
+
+    def truncate_incomplete_games(self) -> int:
+        '''
+        Truncates the columns to the last complete game (see open), so the
+        rows left by an interrupted append don't misalign the next one.
+        Returns the amount of moves of the complete games.
+        '''
+
+        def get_length(path: str, dtype: np.dtype) -> int:
+            return os.path.getsize(path) // dtype.itemsize \
+                if os.path.exists(path) else 0
+
+        total_games: int = min(
+            get_length(self.game_ends_path, GAME_END_DTYPE),
+            get_length(self.winners_path, WINNERS_DTYPE)
+        )
+        total_moves: int = 0
+        if total_games > 0:
+            with open(self.game_ends_path, 'rb') as file:
+                file.seek((total_games - 1) * GAME_END_DTYPE.itemsize)
+                total_moves = int(np.frombuffer(
+                    file.read(GAME_END_DTYPE.itemsize), GAME_END_DTYPE
+                )[0])
+
+        for path, dtype, length in (
+            (self.moves_path, MOVE_DTYPE, total_moves),
+            (self.game_ends_path, GAME_END_DTYPE, total_games),
+            (self.winners_path, WINNERS_DTYPE, total_games),
+        ):
+            if os.path.exists(path) \
+                    and os.path.getsize(path) != length * dtype.itemsize:
+                os.truncate(path, length * dtype.itemsize)
+        return total_moves
+
+    def __len__(self) -> int:
+        '''
+        Returns the amount of complete games stored.
+        '''
+
+        return len(self.open()[1])
+
+    def append_games(self, games: list[dict[str, Any]]) -> None:
+        '''
+        Appends the given games (in the StatisticsLogger format).
+        '''
+
+        if len(games) == 0:
+            return
+
+        rows: list[tuple[int, int, int]] = []
+        game_ends: list[int] = []
+        winners: list[int] = []
+        first_move: int = self.truncate_incomplete_games()
+        for game in games:
+            for entity_index, entity in enumerate(ENTITIES):
+                moves_list: list[Any] = game[f'{entity}_moves']
+                for i in range(0, len(moves_list), 2):
+                    move: int = HIT if moves_list[i] == 'H' else STAND
+                    rows.append((entity_index, move, moves_list[i + 1]))
+            game_ends.append(first_move + len(rows))
+            winners.append(sum(
+                1 << ENTITIES.index(winner)
+                for winner in game['winners'] if winner in ENTITIES
+            ))
+
+        # The moves go first, so a game is only complete (see open) when all
+        # of its moves are stored.
+        with open(self.moves_path, 'ab') as file:
+            file.write(np.array(rows, MOVE_DTYPE).tobytes())
+        with open(self.game_ends_path, 'ab') as file:
+            file.write(np.array(game_ends, GAME_END_DTYPE).tobytes())
+        with open(self.winners_path, 'ab') as file:
+            file.write(np.array(winners, WINNERS_DTYPE).tobytes())
+
+    def get_win_percentage(self) -> list[float]:
+        '''
+        Returns the percentage of win per player.
+        Order: Croupier, ai1, ai2, human.
+        '''
+
+        _, _, winners = self.open()
+        if len(winners) == 0:
+            return [0, 0, 0, 0]
+        return [
+            100 * int(np.count_nonzero(winners & (1 << i))) / len(winners)
+            for i in range(len(ENTITIES))
+        ]
+
+    def get_success_percentage(self) -> list[float]:
+        '''
+        Returns the percentage of right decisions made per player (see
+        StatisticsLogger.get_success_percentage).
+        Order: Croupier, ai1, ai2, human.
+        '''
+
+        moves, _, _ = self.open()
+        entities: np.ndarray = moves['entity']
+        hit: np.ndarray = moves['move'] == HIT
+        values: np.ndarray = moves['value']
+        bad: np.ndarray = hit & (values > 21) | ~hit & (values < 17)
+
+        total_decisions: np.ndarray = \
+            np.bincount(entities, minlength=len(ENTITIES))
+        bad_decisions: np.ndarray = \
+            np.bincount(entities[bad], minlength=len(ENTITIES))
+        if 0 in total_decisions:
+            return [0, 0, 0, 0]
+        return [float(i) for i in 100 - 100 * bad_decisions / total_decisions]
+
+    def get_stand_values(self) -> list[np.ndarray]:
+        '''
+        Returns the stand values per player of every game (see
+        StatisticsLogger.get_stand_values), as arrays.
+        '''
+
+        moves, game_ends, _ = self.open()
+        total_games: int = len(game_ends)
+        # Game of each move.
+        moves_per_game: np.ndarray = np.diff(game_ends, prepend=0)
+        game_ids: np.ndarray = np.repeat(np.arange(total_games), moves_per_game)
+
+        stand_values: list[np.ndarray] = []
+        for entity_index in range(len(ENTITIES)):
+            selected: np.ndarray = moves['entity'] == entity_index
+            games: np.ndarray = game_ids[selected]
+            values: np.ndarray = moves['value'][selected]
+            stands: np.ndarray = moves['move'][selected] == STAND
+            entity_values: np.ndarray = np.zeros(total_games, np.int64)
+
+            # The last hand value of each game is used when there's no stand.
+            if len(games) > 0:
+                last: np.ndarray = \
+                    np.flatnonzero(np.r_[games[1:] != games[:-1], True])
+                entity_values[games[last]] = values[last]
+
+            # Otherwise, the hand value of the first stand.
+            stand_games: np.ndarray = games[stands]
+            stand_hand_values: np.ndarray = values[stands]
+            if len(stand_games) > 0:
+                first: np.ndarray = np.flatnonzero(
+                    np.r_[True, stand_games[1:] != stand_games[:-1]]
+                )
+                entity_values[stand_games[first]] = stand_hand_values[first]
+            stand_values.append(entity_values)
+        return stand_values
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Columnar store of games.')
+    parser.add_argument('command', choices=['import', 'report'])
+    parser.add_argument('--directory', default=COLUMNAR_DIRECTORY)
+    args = parser.parse_args()
+
+    store: ColumnarGameStore = ColumnarGameStore(args.directory)
+    if args.command == 'import':
+        game_log: GameLog = GameLog()
+        for path in game_log.get_segments():
+            store.append_games(GameLog.read_segment(path))
+        print(f'{len(store)} games in {args.directory}')
+    else:
+        print('Games:', len(store))
+        print('Win percentage:', store.get_win_percentage())
+        print('Success percentage:', store.get_success_percentage())
+        print('Average stand values:',
+              [float(np.mean(values)) for values in store.get_stand_values()])
@@ -0,0 +1,153 @@
+'''
+Probability distribution of the final hand of the croupier.
+The croupier hits while its hand is below 17 (see Crupier.make_move), so it
+always ends with 17, 18, 19, 20, 21 or busted. The distribution is computed
+by enumerating every card the croupier could draw, given the composition
+of the deck (see probability.py for the value_counts format).
+The exact distribution removes every drawn card from the deck. A faster
+approximation draws every card with the probabilities of the given deck,
+which is very close with a shoe of several decks.
+The game only uses the approximation: the AI decisions (see
+solver.get_action_values) and the probabilities shown on the web page (see
+Crupier.get_render_data). The exact distribution is there for analysis and
+to check the approximation.
+'''
+
+from functools import lru_cache
+from .probability import (
+    CARD_VALUES, add_card_to_state, get_hand_state, hand_value
+)
+
+
+# Possible final hands of the croupier, in the order used by the
+# distributions returned in this module.
+OUTCOMES: tuple[str, ...] = ('17', '18', '19', '20', '21', 'bust')
+
+# Maximum amount of distributions kept in memory. The least recently used
+# are discarded first.
+MEMO_SIZE: int = 4096
+
+
+def get_dealer_outcomes(
+    upcard_value: int, value_counts: list[int], exact: bool = True
+) -> tuple[float, ...]:
+    '''
+    Returns the probability of each final hand of the croupier (see
+    OUTCOMES) when its showing card has the given value. The hidden card
+    has to be included in value_counts, since it's unknown.
+    If exact is False, the faster approximation is used.
+    '''
+
+    aces: int = 1 if upcard_value == 11 else 0
+    return get_hand_outcomes(upcard_value, aces, value_counts, exact)
+
+
+def get_hand_outcomes(
+    raw_total: int, aces: int, value_counts: list[int], exact: bool = True
+) -> tuple[float, ...]:
+    '''
+    Same as get_dealer_outcomes, but starting from a hand with the given
+    raw total (aces counted as 11) and amount of aces.
+    '''
+
+    if exact:
+        return _get_hand_outcomes(raw_total, aces, tuple(value_counts))
+    return _get_approximate_outcomes(raw_total, aces, tuple(value_counts))
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _get_hand_outcomes(
+    raw_total: int, aces: int, value_counts: tuple[int, ...]
+) -> tuple[float, ...]:
+    # Inside a single query the starting hand is fixed, so the cards drawn
+    # so far determine the hand. That's why this memo is keyed only by the
+    # drawn cards, encoded as an integer (4 bits per value) to keep it fast.
+    memo: dict[int, list[float]] = {}
+    counts: list[int] = list(value_counts)
+
+    def enumerate_draws(
+        raw_total: int, aces: int, cards_left: int, drawn: int
+    ) -> list[float]:
+        if drawn in memo:
+            return memo[drawn]
+
+        outcomes: list[float] = [0.0] * len(OUTCOMES)
+        # If there are no cards left the croupier can't finish its hand.
+        # That case is left out of the distribution (all zeros).
+        for card_value in CARD_VALUES:
+            count: int = counts[card_value]
+            if count == 0:
+                continue
+            probability: float = count / cards_left
+            new_aces: int = aces + 1 if card_value == 11 else aces
+            value: int = hand_value(raw_total + card_value, new_aces)
+            # Final hands are added directly, to save most of the calls.
+            if value > 21:
+                outcomes[-1] += probability
+            elif value >= 17:
+                outcomes[value - 17] += probability
+            else:
+                counts[card_value] -= 1
+                sub_outcomes: list[float] = enumerate_draws(
+                    raw_total + card_value, new_aces, cards_left - 1,
+                    drawn + (1 << 4 * card_value)
+                )
+                counts[card_value] += 1
+                for i in range(len(OUTCOMES)):
+                    outcomes[i] += probability * sub_outcomes[i]
+
+        memo[drawn] = outcomes
+        return outcomes
+
+    value: int = hand_value(raw_total, aces)
+    outcomes: list[float] = [0.0] * len(OUTCOMES)
+    if value > 21:
+        outcomes[-1] = 1.0
+    elif value >= 17:
+        outcomes[value - 17] = 1.0
+    elif sum(value_counts) > 0:
+        outcomes = enumerate_draws(raw_total, aces, sum(value_counts), 0)
+    return tuple(outcomes)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _get_approximate_outcomes(
+    raw_total: int, aces: int, value_counts: tuple[int, ...]
+) -> tuple[float, ...]:
+    # Since the probabilities don't change, the state of the hand (value and
+    # soft flag) is enough to key the memo.
+    memo: dict[tuple[int, bool], list[float]] = {}
+    cards_left: int = sum(value_counts)
+
+    def finish_hand(total: int, soft: bool) -> list[float]:
+        if (total, soft) in memo:
+            return memo[(total, soft)]
+
+        outcomes: list[float] = [0.0] * len(OUTCOMES)
+        if total > 21:
+            outcomes[-1] = 1.0
+        elif total >= 17:
+            outcomes[total - 17] = 1.0
+        elif cards_left > 0:
+            for card_value in CARD_VALUES:
+                count: int = value_counts[card_value]
+                if count == 0:
+                    continue
+                probability: float = count / cards_left
+                sub_outcomes: list[float] = \
+                    finish_hand(*add_card_to_state(total, soft, card_value))
+                for i in range(len(OUTCOMES)):
+                    outcomes[i] += probability * sub_outcomes[i]
+
+        memo[(total, soft)] = outcomes
+        return outcomes
+
+    return tuple(finish_hand(*get_hand_state(raw_total, aces)))
+
+
+def outcomes_to_dict(outcomes: tuple[float, ...]) -> dict[str, float]:
+    '''
+    Returns the given distribution as a dictionary (for the web app).
+    '''
+
+    return dict(zip(OUTCOMES, outcomes))
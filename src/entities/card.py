@@ -1,14 +1,18 @@
-class Card:
+from typing import NamedTuple
+
+
+# A NamedTuple, so the cards are immutable: the table of cards (see
+# deck.CARDS) is shared by every table.
+class Card(NamedTuple):
     """ Class that represents a card of a blackjack game. """
 
-    def __init__(self, value: int, filename: str, color: int) -> None:
-        self.value = value
-        self.filename = filename
-        self.color = color  # Color 0: black. Color 1: red.
+    value: int
+    filename: str
+    color: int  # Color 0: black. Color 1: red.
 
     def __str__(self) -> str:
         return f'{self.value}'
-    
+
     def to_dict(self) -> dict:
         return {
             'value': self.value,
@@ -1,7 +1,77 @@
-from random import randint
+import numpy as np
 from .card import Card
 
 
+# All 52 cards of a standard deck. The position of a card in this tuple is
+# its id: the deck, the hands and the web page use the ids (0 to 51), and
+# this table is only needed to show the cards.
+CARDS: tuple[Card, ...] = (
+    Card(2, '2_of_clubs.png', 0),
+    Card(2, '2_of_diamonds.png', 1),
+    Card(2, '2_of_hearts.png', 1),
+    Card(2, '2_of_spades.png', 0),
+    Card(3, '3_of_clubs.png', 0),
+    Card(3, '3_of_diamonds.png', 1),
+    Card(3, '3_of_hearts.png', 1),
+    Card(3, '3_of_spades.png', 0),
+    Card(4, '4_of_clubs.png', 0),
+    Card(4, '4_of_diamonds.png', 1),
+    Card(4, '4_of_hearts.png', 1),
+    Card(4, '4_of_spades.png', 0),
+    Card(5, '5_of_clubs.png', 0),
+    Card(5, '5_of_diamonds.png', 1),
+    Card(5, '5_of_hearts.png', 1),
+    Card(5, '5_of_spades.png', 0),
+    Card(6, '6_of_clubs.png', 0),
+    Card(6, '6_of_diamonds.png', 1),
+    Card(6, '6_of_hearts.png', 1),
+    Card(6, '6_of_spades.png', 0),
+    Card(7, '7_of_clubs.png', 0),
+    Card(7, '7_of_diamonds.png', 1),
+    Card(7, '7_of_hearts.png', 1),
+    Card(7, '7_of_spades.png', 0),
+    Card(8, '8_of_clubs.png', 0),
+    Card(8, '8_of_diamonds.png', 1),
+    Card(8, '8_of_hearts.png', 1),
+    Card(8, '8_of_spades.png', 0),
+    Card(9, '9_of_clubs.png', 0),
+    Card(9, '9_of_diamonds.png', 1),
+    Card(9, '9_of_hearts.png', 1),
+    Card(9, '9_of_spades.png', 0),
+    Card(10, '10_of_clubs.png', 0),
+    Card(10, '10_of_diamonds.png', 1),
+    Card(10, '10_of_hearts.png', 1),
+    Card(10, '10_of_spades.png', 0),
+    Card(10, 'jack_of_clubs.png', 0),
+    Card(10, 'jack_of_diamonds.png', 1),
+    Card(10, 'jack_of_hearts.png', 1),
+    Card(10, 'jack_of_spades.png', 0),
+    Card(10, 'queen_of_clubs.png', 0),
+    Card(10, 'queen_of_diamonds.png', 1),
+    Card(10, 'queen_of_hearts.png', 1),
+    Card(10, 'queen_of_spades.png', 0),
+    Card(10, 'king_of_clubs.png', 0),
+    Card(10, 'king_of_diamonds.png', 1),
+    Card(10, 'king_of_hearts.png', 1),
+    Card(10, 'king_of_spades.png', 0),
+    Card(11, 'ace_of_clubs.png', 0),
+    Card(11, 'ace_of_diamonds.png', 1),
+    Card(11, 'ace_of_hearts.png', 1),
+    Card(11, 'ace_of_spades.png', 0),
+)
+
+# 6 full decks are going to be used, that is, 6 of every card.
+DECKS_PER_SHOE: int = 6
+
+# Value of each card, indexed by card id.
+CARD_VALUES_BY_ID: tuple[int, ...] = tuple(card.value for card in CARDS)
+
+# Ids of the cards of each value, indexed by value (aces are 11).
+VALUE_CARD_IDS: list[list[int]] = [[] for _ in range(12)]
+for card_id, card in enumerate(CARDS):
+    VALUE_CARD_IDS[card.value].append(card_id)
+
+
 class Deck:
     """ Class that represents a deck of cards of a blackjack game. """
     
@@ -18,112 +88,141 @@ class Deck:
         return Deck.instance
         
 
-    def __init__(self) -> None:
-        # This list contains all 52 cards of a standard deck
-        self.unshown_cards: list[Card] = [
-            Card(2, '2_of_clubs.png', 0),
-            Card(2, '2_of_diamonds.png', 1),
-            Card(2, '2_of_hearts.png', 1),
-            Card(2, '2_of_spades.png', 0),
-            Card(3, '3_of_clubs.png', 0),
-            Card(3, '3_of_diamonds.png', 1),
-            Card(3, '3_of_hearts.png', 1),
-            Card(3, '3_of_spades.png', 0),
-            Card(4, '4_of_clubs.png', 0),
-            Card(4, '4_of_diamonds.png', 1),
-            Card(4, '4_of_hearts.png', 1),
-            Card(4, '4_of_spades.png', 0),
-            Card(5, '5_of_clubs.png', 0),
-            Card(5, '5_of_diamonds.png', 1),
-            Card(5, '5_of_hearts.png', 1),
-            Card(5, '5_of_spades.png', 0),
-            Card(6, '6_of_clubs.png', 0),
-            Card(6, '6_of_diamonds.png', 1),
-            Card(6, '6_of_hearts.png', 1),
-            Card(6, '6_of_spades.png', 0),
-            Card(7, '7_of_clubs.png', 0),
-            Card(7, '7_of_diamonds.png', 1),
-            Card(7, '7_of_hearts.png', 1),
-            Card(7, '7_of_spades.png', 0),
-            Card(8, '8_of_clubs.png', 0),
-            Card(8, '8_of_diamonds.png', 1),
-            Card(8, '8_of_hearts.png', 1),
-            Card(8, '8_of_spades.png', 0),
-            Card(9, '9_of_clubs.png', 0),
-            Card(9, '9_of_diamonds.png', 1),
-            Card(9, '9_of_hearts.png', 1),
-            Card(9, '9_of_spades.png', 0),
-            Card(10, '10_of_clubs.png', 0),
-            Card(10, '10_of_diamonds.png', 1),
-            Card(10, '10_of_hearts.png', 1),
-            Card(10, '10_of_spades.png', 0),
-            Card(10, 'jack_of_clubs.png', 0),
-            Card(10, 'jack_of_diamonds.png', 1),
-            Card(10, 'jack_of_hearts.png', 1),
-            Card(10, 'jack_of_spades.png', 0),
-            Card(10, 'queen_of_clubs.png', 0),
-            Card(10, 'queen_of_diamonds.png', 1),
-            Card(10, 'queen_of_hearts.png', 1),
-            Card(10, 'queen_of_spades.png', 0),
-            Card(10, 'king_of_clubs.png', 0),
-            Card(10, 'king_of_diamonds.png', 1),
-            Card(10, 'king_of_hearts.png', 1),
-            Card(10, 'king_of_spades.png', 0),
-            Card(11, 'ace_of_clubs.png', 0),
-            Card(11, 'ace_of_diamonds.png', 1),
-            Card(11, 'ace_of_hearts.png', 1),
-            Card(11, 'ace_of_spades.png', 0)
-        ]
-        self.shown_cards: list[Card] = []
-
-        # 6 full decks are going to be used, that is, 6 of every card
-        for i in range(52):
-            self.unshown_cards += [self.unshown_cards[i] for _ in range(5)]
-
-    def get_random_card(self) -> Card:
+    # Random numbers are taken from the generator in batches of this size,
+    # as asking it for one number at a time is slow.
+    RANDOM_BATCH: int = 256
+
+    def __init__(self, rng: np.random.Generator = None) -> None:
+        # Generator of the deck's table. Runs with the same seed deal the same
+        # cards. If it's None, a generator seeded by the system is used.
+        self.rng: np.random.Generator = \
+            rng if rng is not None else np.random.default_rng()
+        self.random_numbers: list[float] = []
+        # Instead of a list of cards, the deck keeps how many copies of each
+        # card are left, so draws and value queries don't depend on the
+        # size of the deck and copies are cheap.
+        # Amount of unshown copies per card, indexed by card id (see CARDS).
+        self.card_counts: list[int] = [DECKS_PER_SHOE] * len(CARDS)
+        # Amount of unshown cards per value, indexed by value.
+        self.value_counts: list[int] = \
+            [DECKS_PER_SHOE * len(ids) for ids in VALUE_CARD_IDS]
+        self.cards_left: int = DECKS_PER_SHOE * len(CARDS)
+
+    def get_random_card(self) -> int:
         """
-        Picks a random card and returns it. Also moves
-        the card from unshown_cards to shown_cards.
+        Picks a random card and returns its id (see CARDS). Also removes it
+        from the unshown cards. Every unshown card has the same chance.
         """
 
-        card_index = randint(0, len(self.unshown_cards) - 1)
-        try:
-            card = self.unshown_cards[card_index]
-            del self.unshown_cards[card_index]
-        except IndexError:
+        if self.cards_left == 0:
             raise IndexError('Tried to get a card from a empty deck.')
 
-        self.shown_cards.append(card)
-        return card
+        # First the value is chosen, weighted by the cards left of each
+        # value, and then the card inside that value.
+        value, position = self.get_value_at(self.get_random_position())
+        for card_id in VALUE_CARD_IDS[value]:
+            if position < self.card_counts[card_id]:
+                break
+            position -= self.card_counts[card_id]
+
+        self.remove_card(card_id)
+        return card_id
+
+    def remove_card(self, card_id: int) -> None:
+        '''
+        Takes the card with the given id out of the unshown cards.
+        '''
+
+        self.card_counts[card_id] -= 1
+        self.value_counts[CARD_VALUES_BY_ID[card_id]] -= 1
+        self.cards_left -= 1
+
+    def needs_reshuffle(self) -> bool:
+        '''
+        Returns True if the deck should be reset before the next round. A
+        plain deck is only reset when it runs low (see GameEngine).
+        '''
+
+        return False
     
+    def get_random_position(self) -> int:
+        '''
+        Returns a random position among the unshown cards.
+        '''
+
+        if not self.random_numbers:
+            self.random_numbers = \
+                self.rng.random(Deck.RANDOM_BATCH).tolist()
+        return int(self.random_numbers.pop() * self.cards_left)
+
+    def get_value_at(self, position: int) -> tuple[int, int]:
+        '''
+        Returns the value of the card at the given position of the unshown
+        cards (sorted by value), and the position among the cards of that
+        value.
+        '''
+
+        value: int = 2
+        while position >= self.value_counts[value]:
+            position -= self.value_counts[value]
+            value += 1
+        return value, position
+
+    def peek_random_value(self) -> int:
+        '''
+        Returns the value of a random unshown card, without removing it.
+        Every unshown card has the same chance.
+        '''
+
+        if self.cards_left == 0:
+            raise IndexError('Tried to get a card from a empty deck.')
+        return self.get_value_at(self.get_random_position())[0]
+
     def get_cards_left_of_value(self, value: int) -> int:
         """
         Returns the amount of cards left in the deck with a certain value.
         """
-        amount = 0
-        for card in self.unshown_cards:
-            if card.value == value:
-                amount += 1
-        return amount
+
+        if value < 0 or value >= len(self.value_counts):
+            return 0
+        return self.value_counts[value]
+
+    def get_value_counts(self) -> list[int]:
+        '''
+        Returns the amount of cards left per value, in a list indexed by
+        value (aces are 11, so it has 12 positions; 0 and 1 are unused).
+        '''
+
+        return self.value_counts.copy()
 
     def reset(self) -> None:
         '''
-        Puts all cards in unshown_cards.
+        Puts all cards back in the deck.
         '''
 
-        self.unshown_cards += self.shown_cards
-        self.shown_cards = []
-        if len(self.unshown_cards) != 6 * 52:
-            print('Something strange happened. A card was stolen. See Deck.')
+        self.card_counts = [DECKS_PER_SHOE] * len(CARDS)
+        self.value_counts = \
+            [DECKS_PER_SHOE * len(ids) for ids in VALUE_CARD_IDS]
+        self.cards_left = DECKS_PER_SHOE * len(CARDS)
 
-    def copy(self) -> 'Deck':
+    def copy(self, rng: np.random.Generator = None) -> 'Deck':
         '''
-        Returns a copy of the deck.
+        Returns a copy of the deck. It draws from the given generator or, by
+        default, from the same one (and its pending random numbers), so
+        simulations on copies are reproducible too.
         '''
 
-        deck = Deck()
-        deck.unshown_cards = self.unshown_cards.copy()
-        deck.shown_cards = self.shown_cards.copy()
+        # __init__ is skipped, the counters are copied directly.
+        deck = Deck.__new__(Deck)
+        if rng is None:
+            deck.rng = self.rng
+            deck.random_numbers = self.random_numbers
+        else:
+            deck.rng = rng
+            deck.random_numbers = []
+        deck.card_counts = self.card_counts.copy()
+        deck.value_counts = self.value_counts.copy()
+        deck.cards_left = self.cards_left
         return deck
 
     def __len__(self) -> int:
@@ -131,4 +230,71 @@ class Deck:
         Returns the amount of unshown cards.
         """
 
-        return len(self.unshown_cards)
+        return self.cards_left
+
+
+class Shoe(Deck):
+    '''
+    Deck dealt in a fixed order, like a real shoe: the cards are shuffled
+    once (see shuffle) and each draw just moves a cursor forward. A cut card
+    is placed at the given penetration (fraction of the shoe dealt), and
+    when it's reached the shoe is reshuffled before the next round, so it
+    never runs out.
+    The counters of Deck are kept up to date, so the probabilities still
+    see the unshown cards. Copies (used by the simulations) are plain decks
+    that draw at random from the unshown cards: the order of the shoe is
+    unknown to the players.
+    '''
+
+    # Fraction of the shoe dealt before reshuffling.
+    DEFAULT_PENETRATION: float = 0.75
+
+    def __init__(
+        self,
+        rng: np.random.Generator = None,
+        penetration: float = DEFAULT_PENETRATION
+    ) -> None:
+        super().__init__(rng)
+        if not 0 < penetration <= 1:
+            raise ValueError('The penetration must be in (0, 1].')
+        self.penetration: float = penetration
+        self.shuffle()
+
+    def shuffle(self) -> None:
+        '''
+        Puts the cards of the shoe in a new random order and places the cut
+        card. The counters must be full (see reset).
+        '''
+
+        card_ids: np.ndarray = \
+            np.repeat(np.arange(len(CARDS)), DECKS_PER_SHOE)
+        self.order: list[int] = self.rng.permutation(card_ids).tolist()
+        self.cursor: int = 0
+        self.cut_card: int = int(len(self.order) * self.penetration)
+
+    def get_random_card(self) -> int:
+        '''
+        Deals the next card of the shoe and returns its id.
+        '''
+
+        if self.cursor >= len(self.order):
+            raise IndexError('Tried to get a card from a empty deck.')
+        card_id: int = self.order[self.cursor]
+        self.cursor += 1
+        self.remove_card(card_id)
+        return card_id
+
+    def needs_reshuffle(self) -> bool:
+        '''
+        Returns True if the cut card was reached.
+        '''
+
+        return self.cursor >= self.cut_card
+
+    def reset(self) -> None:
+        '''
+        Puts all cards back in the shoe and shuffles it.
+        '''
+
+        super().reset()
+        self.shuffle()
@@ -2,22 +2,43 @@
 contains all the players types in the game
 '''
 
-from ..socketio_setup import socketio
-import eventlet
+from eventlet.queue import LightQueue, Empty
 from abc import ABC, abstractmethod
 import numpy as np
-from .card import Card
-from .deck import Deck
-from ..statistics_logger import StatisticsLogger
+from .deck import CARDS, CARD_VALUES_BY_ID, Deck
+from ..statistics_logger import Game, StatisticsLogger
+from ..probability import add_card_to_state, hit_safe_probability
+from ..dealer_outcomes import get_dealer_outcomes, get_hand_outcomes, outcomes_to_dict
+from ..solver import get_best_action
+from ..qtable_checkpoints import load_checkpoint, save_checkpoint
+from .. import timings
 
 
 class Player(ABC):
 
+    # The players are created once per table and used many times per round,
+    # so their attributes are fixed (see the subclasses too).
+    __slots__ = (
+        'hand', 'raw_total', 'aces', 'hand_value', 'soft', 'standing',
+        'busted', 'position', 'verbose', 'deck', 'game_record'
+    )
+
     def __init__(self):
-        self.hand: list[Card] = []
+        self.hand: list[int] = []  # Ids of the cards (see deck.CARDS).
+        # The hand is summarized as the cards are added (see add_card), so
+        # the hand value is not computed again on every query.
+        self.raw_total: int = 0  # Sum of the cards, aces counted as 11.
+        self.aces: int = 0
+        self.hand_value: int = 0
+        self.soft: bool = False  # True if an ace counts as 11.
         self.standing: bool = False
         self.busted: bool = False
         self.position = ''
+        self.verbose: bool = True  # If False, the player doesn't print.
+        # Deck and game record of the player's table. If they're None, the
+        # shared ones are used (see get_deck and get_game_record).
+        self.deck: Deck = None
+        self.game_record: Game = None
 
     @abstractmethod
     def make_move(self) -> None:
@@ -48,30 +69,77 @@ class Player(ABC):
         Returns the value of the player's hand
         '''
 
-        hand_value = 0
-        for card in self.hand:
-            hand_value += card.value
-        
-        # Check if there are aces in the hand
-        aces = [card for card in self.hand if card.value == 11]
-        for ace in aces:
-            if hand_value > 21:
-                hand_value -= 10
+        return self.hand_value
+
+    def is_soft(self) -> bool:
+        '''
+        Returns True if an ace of the hand counts as 11.
+        '''
+
+        return self.soft
+
+    def get_hand_totals(self) -> tuple[int, int]:
+        '''
+        Returns the sum of the player's hand counting aces as 11, and the
+        amount of aces in it.
+        '''
+
+        return self.raw_total, self.aces
+
+    def add_card(self, card: int) -> None:
+        '''
+        Adds the card with the given id to the hand and updates its value.
+        '''
+
+        value: int = CARD_VALUES_BY_ID[card]
+        self.hand.append(card)
+        self.raw_total += value
+        if value == 11:
+            self.aces += 1
+        self.hand_value, self.soft = \
+            add_card_to_state(self.hand_value, self.soft, value)
+
+    def set_hand(self, cards: list[int]) -> None:
+        '''
+        Replaces the hand with (a copy of) the given cards.
+        '''
+
+        self.hand = []
+        self.raw_total = 0
+        self.aces = 0
+        self.hand_value = 0
+        self.soft = False
+        for card in cards:
+            self.add_card(card)
+
+    def get_deck(self) -> Deck:
+        '''
+        Returns the deck of the player's table, or the shared deck.
+        '''
+
+        return self.deck if self.deck is not None else Deck.getDeck()
 
-        return hand_value
+    def get_game_record(self) -> Game:
+        '''
+        Returns the game where the player's moves are logged: the one of
+        its table, or the current game of the shared StatisticsLogger.
+        '''
 
+        if self.game_record is not None:
+            return self.game_record
+        return StatisticsLogger.get_logger().current_game
 
-    def add_card_to_hand(self) -> Card:
+    def add_card_to_hand(self) -> int:
         '''
         Adds a card to the player's hand from the deck instance.
-        It returns the card added to the hand.
+        It returns the id of the card added to the hand.
         '''
-        deck : Deck = Deck.getDeck()
+        deck : Deck = self.get_deck()
         if len(deck) == 0:
             print('WARNING: Tried to add card to hand with an empty deck. See Player.')
             return
         card = deck.get_random_card()
-        self.hand.append(card)
+        self.add_card(card)
         return card
 
     def reset(self) -> None:
@@ -79,11 +147,11 @@ class Player(ABC):
         Resets the player's game state
         '''
 
-        self.hand = []
+        self.set_hand([])
         self.standing = False
         self.busted = False
 
-    def get_hand(self) -> list[Card]:
+    def get_hand(self) -> list[int]:
         '''
         Sends the player's hand
         '''
@@ -95,16 +163,14 @@ class Player(ABC):
         Returns True if the player's hand value is greater than 21
         '''
 
-        return True if self.get_hand_value() > 21 else False
+        return self.hand_value > 21
 
     def is_blackjack(self) -> bool:
         '''
         Returns True if the player's hand value is 21
         '''
 
-        if self.get_hand_value() == 21 and len(self.get_hand()) == 2:
-            return True
-        return False
+        return self.hand_value == 21 and len(self.hand) == 2
 
     def is_standing(self) -> bool:
         '''
@@ -137,35 +203,39 @@ class Player(ABC):
                 return 'standby'
             return 'playing'
 
-    def renderOnWeb(self, hideHand : bool = False) -> None:
+    def get_render_data(self, hideHand : bool = False) -> dict:
         '''
-        Sends the current state of the player to the web app
-        for rendering.
+        Returns the data sent to the web app to render the player.
         '''
 
-        socketio.emit('update-and-render', {
+        return {
             'position': self.position,
             'hideHand': hideHand,
-            'hand': [card.to_dict() for card in self.get_hand()],
+            'hand': list(self.get_hand()),  # Card ids (see deck.CARDS).
             'standing': self.is_standing(),
             'busted': self.is_busted(),
             'state': self.get_state(),
             'handValue': self.get_hand_value(),
             'hitSafeProbability': self.calculate_hit_probability()
-        })
-        eventlet.sleep(0)
+        }
 
-    def calculate_hit_probability(self) -> float:
+    @timings.timed_function('Player.calculate_hit_probability')
+    def calculate_hit_probability(self, monte_carlo: bool = False) -> float:
         '''
         Calculates how safe is to hit based on the current state.
+        The probability is exact, computed from the cards left per value.
+        If monte_carlo is True, it's estimated by simulation instead (slow,
+        just to verify the exact result).
         '''
-        hit_safe_probability = 0.0
 
-        # Simulate the player's move
-        simulation_results = self.simulate_multiple_moves()
-        hit_safe_probability = sum(simulation_results) / len(simulation_results)
+        if monte_carlo:
+            simulation_results = self.simulate_multiple_moves()
+            return sum(simulation_results) / len(simulation_results)
 
-        return hit_safe_probability
+        raw_total, aces = self.get_hand_totals()
+        return hit_safe_probability(
+            raw_total, aces, self.get_deck().get_value_counts()
+        )
 
     def simulate_multiple_moves(self) -> list[float]:
         '''
@@ -186,38 +256,34 @@ class Player(ABC):
         Simulates a move of the player based on the current state.
         Returns the probability of hitting safely.
         '''
-        deck_copy = Deck.getDeck().copy()
-        player_copy = self.copy()
-        # crupier_copy = self.crupier.copy()
-        hit_safe_probability = 0.0
-
-        # Simulate the player's move
-        card = deck_copy.get_random_card()
-        player_copy.hand.append(card)
-        if player_copy.is_busted():
-            hit_safe_probability = 0.0
-        else:
-            hit_safe_probability = 1.0
-
-        return hit_safe_probability
+        # Only the value of the card matters, so nothing is copied: the
+        # card isn't taken from the deck and the new hand value is computed
+        # from the current one.
+        value: int = self.get_deck().peek_random_value()
+        new_hand_value, _ = add_card_to_state(self.hand_value, self.soft, value)
+        return 0.0 if new_hand_value > 21 else 1.0
 
     def __str__(self) -> str:
-        return f'Hand ({self.get_hand_value()}): {self.hand}'
+        cards: list[str] = [str(CARDS[card]) for card in self.hand]
+        return f'Hand ({self.get_hand_value()}): {cards}'
 
 
 class Crupier(Player):
+
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
         self.position = 'crupier'
 
     def make_move(self) -> None:
-        logger: StatisticsLogger = StatisticsLogger.get_logger()
+        game_record: Game = self.get_game_record()
         if self.get_hand_value() < 17:
-            self.hit(Deck.getDeck())
-            logger.log_move('croupier', 'H', self.get_hand_value())
+            self.hit(self.get_deck())
+            game_record.log_move('croupier', 'H', self.get_hand_value())
         else:
             self.stand()
-            logger.log_move('croupier', 'S', self.get_hand_value())
+            game_record.log_move('croupier', 'S', self.get_hand_value())
 
     def stand(self) -> None:
         self.standing = True
@@ -230,20 +296,78 @@ class Crupier(Player):
             return
         self.add_card_to_hand()
 
-    def get_showing_card(self) -> Card:
+    def get_showing_card(self) -> int:
         '''
-        Returns the first card in the crupier's hand
+        Returns the id of the first card in the crupier's hand
         '''
         return self.hand[0]
+
+    def get_showing_value(self) -> int:
+        '''
+        Returns the value of the first card in the crupier's hand
+        '''
+        return CARD_VALUES_BY_ID[self.hand[0]]
+
+    def get_outcome_probabilities(
+        self, hole_card_hidden: bool = True, exact: bool = True
+    ) -> dict[str, float]:
+        '''
+        Returns the probability of each final hand of the crupier
+        ('17' to '21' and 'bust'), based on the cards left in the deck.
+        While the second card is hidden, only the showing card is known
+        and the hidden one counts as a card that can still come out.
+        If exact is False, the faster approximation is used (see
+        dealer_outcomes.py), which is what the game uses. The exact ones
+        are only for analysis and the verbose output.
+        '''
+
+        if len(self.hand) == 0:
+            return {}
+
+        if hole_card_hidden:
+            outcomes = get_dealer_outcomes(
+                self.get_showing_value(), self.get_unseen_value_counts(), exact
+            )
+        else:
+            raw_total, aces = self.get_hand_totals()
+            outcomes = get_hand_outcomes(
+                raw_total, aces, self.get_deck().get_value_counts(), exact
+            )
+        return outcomes_to_dict(outcomes)
+
+    def get_unseen_value_counts(self) -> list[int]:
+        '''
+        Returns the cards left per value (see Deck.get_value_counts) as seen
+        by the players, that is, counting the hidden card as not dealt.
+        '''
+
+        value_counts: list[int] = self.get_deck().get_value_counts()
+        for card in self.hand[1:2]:
+            value_counts[CARD_VALUES_BY_ID[card]] += 1
+        return value_counts
+
+    def get_render_data(self, hideHand : bool = False) -> dict:
+        '''
+        Adds the probabilities of the crupier's final hand to the data sent
+        to the web app. The deck changes with every card, so the exact ones
+        would be enumerated again on every render: the approximation is
+        used, which is enough to show them.
+        '''
+
+        data: dict = super().get_render_data(hideHand)
+        data['dealerOutcomes'] = \
+            self.get_outcome_probabilities(hideHand, exact=False)
+        return data
     
     def copy(self) -> 'Crupier':
         '''
         Returns a copy of the crupier.
         '''
         crupier = Crupier()
-        crupier.hand = self.hand.copy()
+        crupier.set_hand(self.hand)
         crupier.standing = self.standing
         crupier.busted = self.busted
+        crupier.deck = self.deck
         return crupier
 
 
@@ -252,8 +376,13 @@ class HumanPlayer(Player):
     Class that represents a human player of a blackjack game.
     '''
 
+    __slots__ = ('moves', 'decision_timeout')
+
     instance : 'HumanPlayer' = None
 
+    # Default seconds to wait for a move before standing (see decision_timeout).
+    DECISION_TIMEOUT : float = 60
+
     @staticmethod
     def get_current_instance() -> 'HumanPlayer':
         return HumanPlayer.instance
@@ -261,47 +390,69 @@ class HumanPlayer(Player):
     def __init__(self):
         super().__init__()
         self.position = 'player'
+        # Moves received from the web page (see receive_move).
+        self.moves: LightQueue = LightQueue()
+        # Seconds to wait for a move before standing (None waits forever).
+        self.decision_timeout: float = HumanPlayer.DECISION_TIMEOUT
 
         HumanPlayer.instance = self
 
     def make_move(self) -> None:
-        
-        socketio.emit('start-player-turn')
-        eventlet.sleep(0)
+        '''
+        Waits for the move of the web page and applies it. The turn events
+        are sent by the renderer of the table (see logic.WebRenderer).
+        '''
+
+        self.play_move(self.wait_for_player_move())
+
+    def play_move(self, move: str) -> None:
+        '''
+        Applies the given move ('hit' or 'stand') and logs it.
+        '''
 
-        move = self.wait_for_player_move()
-        logger: StatisticsLogger = StatisticsLogger.get_logger()
+        game_record: Game = self.get_game_record()
         if move == 'hit':
-            print('Player hit')
+            if self.verbose:
+                print('Player hit')
             self.hit()
-            logger.log_move('human', 'H', self.get_hand_value())
+            game_record.log_move('human', 'H', self.get_hand_value())
         elif move == 'stand':
-            print('Player stand')
+            if self.verbose:
+                print('Player stand')
             self.stand()
-            logger.log_move('human', 'S', self.get_hand_value())
-
-        socketio.emit('end-player-turn')
-
-    def wait_for_player_move(self) -> str:
-        move = None
+            game_record.log_move('human', 'S', self.get_hand_value())
 
-        def handle_move(data : dict):
-            nonlocal move
-            move = data.get('move')
+    def receive_move(self, move: str) -> None:
+        '''
+        Delivers a move sent by the web page of the player's table. The
+        greenthread waiting for it (see wait_for_player_move) wakes up.
+        '''
 
-        socketio.on_event('player-move', handle_move)
+        self.moves.put(move)
 
-        while move is None:
-            eventlet.sleep(0.1)
+    def wait_for_player_move(self, delay: float = 0) -> str:
+        '''
+        Waits until a move is received (see receive_move) and returns it.
+        Moves received before the turn started are ignored. If no move
+        arrives in decision_timeout seconds (counted after the given delay,
+        the time until the page shows the turn), the player stands.
+        '''
 
-        return move
+        while not self.moves.empty():
+            self.moves.get_nowait()
+        timeout: float = None if self.decision_timeout is None \
+            else self.decision_timeout + delay
+        try:
+            return self.moves.get(timeout=timeout)
+        except Empty:
+            return 'stand'
 
     def stand(self) -> None:
         self.standing = True
         pass
 
     def hit(self) -> None:
-        deck : Deck = Deck.getDeck()
+        deck : Deck = self.get_deck()
         if len(deck) == 0:
             # This should never happen. This is just so the app doesn't crash.
             print('WARNING: Tried to hit with an empty deck. See HumanPlayer.')
@@ -314,10 +465,11 @@ class HumanPlayer(Player):
         '''
 
         player = HumanPlayer()
-        player.hand = self.hand.copy()
+        player.set_hand(self.hand)
         player.standing = self.standing
         player.busted = self.busted
         player.position = self.position
+        player.deck = self.deck
         return player
 
 
@@ -327,9 +479,19 @@ class AiPlayer(Player):
     It uses Q-Learning and Probalistic Algorithms to make decisions.
     '''
 
-    def __init__(self, position: str = ''):
+    __slots__ = (
+        'qtable', 'LEARNING_RATE', 'DISCOUNT_FACTOR', 'EXPLORATION_PROBABILITY',
+        'prev_hand_value', 'crupier', 'hit_probability', 'ql_weight',
+        'prob_weight', 'rng'
+    )
+
+    def __init__(self, position: str = '', rng: np.random.Generator = None):
         super().__init__()
         self.position = position
+        # Generator of the player's table, used to explore and to mix the
+        # algorithms. If it's None, one seeded by the system is used.
+        self.rng: np.random.Generator = \
+            rng if rng is not None else np.random.default_rng()
 
         # Matrix with all possible (state, action) pairs.
         # Has dimensions 32x2, 32 states (hand values) and 2 actions.
@@ -355,15 +517,22 @@ class AiPlayer(Player):
             self.ql_weight = 0.6
             self.prob_weight = 0.4
 
+        # Warm start from the latest checkpoint of this position, if any.
+        self.load_qtable()
+
     def make_move(self) -> None:
         '''
         Player chooses what to do on their turn.
         '''
 
-        print('------------------')
-        print('Player hand:', self.get_hand_value())
-        print('Hit safe probability:', self.calculate_hit_probability())
-        print('------------------')
+        if self.verbose:
+            print('------------------')
+            print('Player hand:', self.get_hand_value())
+            print('Hit safe probability:', self.calculate_hit_probability())
+            if self.crupier is not None:
+                print('Crupier outcomes:',
+                      self.crupier.get_outcome_probabilities())
+            print('------------------')
 
         state: int = self.get_hand_value()
         ql_action: int = self.get_ql_action(state)
@@ -376,23 +545,25 @@ class AiPlayer(Player):
         elif ql_action == 1 and prob_action == 1:
             action = 1
         else:
-            random_number = np.random.rand()
+            random_number = self.rng.random()
             if random_number < self.ql_weight:
                 action = ql_action
             else:
                 action = prob_action
 
-        logger: StatisticsLogger = StatisticsLogger.get_logger()
+        game_record: Game = self.get_game_record()
         if action == 0:
-            print('Hitting...')
+            if self.verbose:
+                print('Hitting...')
             self.standing = False
             self.hit()
-            logger.log_move(self.position, 'H', self.get_hand_value())
+            game_record.log_move(self.position, 'H', self.get_hand_value())
         else:
-            print('Standing...')
+            if self.verbose:
+                print('Standing...')
             self.standing = True
             self.stand()
-            logger.log_move(self.position, 'S', self.get_hand_value())
+            game_record.log_move(self.position, 'S', self.get_hand_value())
 
         next_state = self.get_hand_value()
         reward = self.get_reward(state, next_state)
@@ -410,7 +581,7 @@ class AiPlayer(Player):
         Adds a card to the player's hand.
         '''
 
-        deck : Deck = Deck.getDeck()
+        deck : Deck = self.get_deck()
         if len(deck) == 0:
             # This should never happen. This is just so the app doesn't crash.
             print('WARNING: Tried to hit with an empty deck. See HumanPlayer.')
@@ -422,14 +593,58 @@ class AiPlayer(Player):
         Returns a copy of the player.
         '''
 
-        player = AiPlayer()
-        player.hand = self.hand.copy()
+        player = AiPlayer(rng=self.rng)
+        player.set_hand(self.hand)
         player.standing = self.standing
         player.busted = self.busted
         player.qtable = self.qtable.copy()
         player.prev_hand_value = self.prev_hand_value
+        player.deck = self.deck
         return player
 
+    def get_checkpoint_metadata(self) -> dict:
+        '''
+        Returns the hyper-parameters and weights saved with the qtable.
+        '''
+
+        return {
+            'learning_rate': self.LEARNING_RATE,
+            'discount_factor': self.DISCOUNT_FACTOR,
+            'exploration_probability': self.EXPLORATION_PROBABILITY,
+            'ql_weight': self.ql_weight,
+            'prob_weight': self.prob_weight,
+        }
+
+    def load_qtable(self) -> None:
+        '''
+        Loads the latest checkpoint of this player's position, if there's
+        one (see qtable_checkpoints.py). The qtable is memory mapped.
+        '''
+
+        if self.position == '':
+            return
+        checkpoint = load_checkpoint(self.position)
+        if checkpoint is None:
+            return
+        self.qtable, metadata = checkpoint
+        self.LEARNING_RATE = metadata.get('learning_rate', self.LEARNING_RATE)
+        self.DISCOUNT_FACTOR = \
+            metadata.get('discount_factor', self.DISCOUNT_FACTOR)
+        self.EXPLORATION_PROBABILITY = \
+            metadata.get('exploration_probability', self.EXPLORATION_PROBABILITY)
+        self.ql_weight = metadata.get('ql_weight', self.ql_weight)
+        self.prob_weight = metadata.get('prob_weight', self.prob_weight)
+
+    def save_qtable(self) -> int:
+        '''
+        Saves the qtable as a new checkpoint of this player's position.
+        Returns the version saved.
+        '''
+
+        return save_checkpoint(
+            self.position, self.qtable, self.get_checkpoint_metadata()
+        )
+
     def update_qvalue(
         self, current_state: int, next_state: int, action: int, reward: float
     ) -> None:
@@ -455,9 +670,9 @@ class AiPlayer(Player):
         # Available actions: hit (0), stand (1).
         action: int = 0  # Just as default value.
         self.prev_hand_value = state  # For testing purposes.
-        if np.random.rand() < self.EXPLORATION_PROBABILITY:
+        if self.rng.random() < self.EXPLORATION_PROBABILITY:
             # Decides to hit or stand randomly.
-            action = np.random.randint(0, 2)  # Returns 0 or 1.
+            action = int(self.rng.integers(0, 2))  # Returns 0 or 1.
         else:
             # Decides to hit or stand based on the best Q-Value.
             hit_qvalue = self.qtable[state][0]
@@ -499,12 +714,22 @@ class AiPlayer(Player):
     
     def get_prob_action(self) -> int:
         '''
-        Decides if hit or stand based on the current qtable.
+        Decides if hit or stand based on probabilities.
+        If the crupier is known, the action with the best expected value is
+        chosen (see solver.py). Otherwise, it hits if it's likely to not bust.
         '''
 
         # Available actions: hit (0), stand (1).
         action: int = 0
 
+        if self.crupier is not None and len(self.crupier.hand) > 0:
+            raw_total, aces = self.get_hand_totals()
+            return get_best_action(
+                raw_total, aces,
+                self.crupier.get_showing_value(),
+                self.crupier.get_unseen_value_counts()
+            )
+
         hit_safe_probability = self.calculate_hit_probability()
         if hit_safe_probability > 0.6:
             action = 0
@@ -0,0 +1,345 @@
+'''
+Headless engine that plays rounds of blackjack.
+The rules are the ones implemented by the entities (Player, Crupier, etc.).
+Everything related to the web (rendering, animation pauses and the human
+input) goes through hooks, so rounds can be played without a browser.
+Usage (from the project root): python -m src.game_engine 1000
+'''
+
+from typing import Callable
+import argparse
+import time
+import numpy as np
+from .entities.player import AiPlayer, Crupier, Player, HumanPlayer
+from .entities.deck import Deck, Shoe
+from .statistics_logger import Game, StatisticsLogger
+from .columnar_store import ColumnarGameStore
+from . import timings
+
+
+class Renderer:
+    '''
+    Receives the events of a round. This base class ignores all of them,
+    which is what a headless game needs. See logic.WebRenderer.
+    '''
+
+    def render(self, player: Player, hide_hand: bool = False) -> None:
+        '''
+        Called every time the state of a player changes.
+        '''
+
+        pass
+
+    def pause(self, seconds: float) -> None:
+        '''
+        Called where the web game waits for the animations.
+        '''
+
+        pass
+
+    def start_player_turn(self, player: HumanPlayer) -> None:
+        '''
+        Called before asking the human policy for a move.
+        '''
+
+        pass
+
+    def end_player_turn(self, player: HumanPlayer) -> None:
+        '''
+        Called after the human move is applied.
+        '''
+
+        pass
+
+    def game_over(self, results: dict) -> None:
+        '''
+        Called with the results of the round.
+        '''
+
+        pass
+
+
+# A human policy receives the human player and returns 'hit' or 'stand'.
+HumanPolicy = Callable[[HumanPlayer], str]
+
+
+def dealer_like_policy(player: HumanPlayer) -> str:
+    '''
+    Default human policy for headless games: plays like the croupier.
+    '''
+
+    return 'hit' if player.get_hand_value() < 17 else 'stand'
+
+
+class GameEngine:
+    '''
+    Plays rounds with two AI players, a human player and the croupier.
+    The same players are reused between rounds.
+    '''
+
+    # If the deck has less cards than this when a round starts, it's reset.
+    MIN_CARDS_PER_ROUND: int = 52
+
+    def __init__(
+        self,
+        renderer: Renderer = None,
+        human_policy: HumanPolicy = None,
+        verbose: bool = False,
+        deck: Deck = None,
+        seed: int | np.random.SeedSequence = None,
+        penetration: float = None,
+        recorder=None
+    ) -> None:
+        self.renderer: Renderer = renderer if renderer else Renderer()
+        self.human_policy: HumanPolicy = \
+            human_policy if human_policy else dealer_like_policy
+        # Each engine is a table, with its own random generator: engines
+        # with the same seed (and qtables) play the same rounds. Parallel
+        # tables should get seeds spawned from one SeedSequence.
+        # With a penetration, the table deals from a pre-shuffled Shoe.
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        if deck is None:
+            deck = Deck(self.rng) if penetration is None \
+                else Shoe(self.rng, penetration)
+        self.deck: Deck = deck
+        # Moves and winners of the round being played.
+        self.game_record: Game = Game()
+        # Optional RoundRecorder (see round_recorder.py) that receives the
+        # cards, moves and results of every round.
+        self.recorder = recorder
+
+        self.crupier: Crupier = Crupier()
+        self.ai_player1: AiPlayer = AiPlayer('ai1', self.rng)
+        self.ai_player2: AiPlayer = AiPlayer('ai2', self.rng)
+        self.human_player: HumanPlayer = HumanPlayer()
+        self.players: list[Player] = \
+            [self.ai_player1, self.human_player, self.ai_player2]
+        for player in self.players + [self.crupier]:
+            player.verbose = verbose
+            player.deck = self.deck
+        # The AI players can look at the crupier (see AiPlayer.crupier).
+        self.ai_player1.crupier = self.crupier
+        self.ai_player2.crupier = self.crupier
+
+    def play_round(self, store: bool = True, keep: bool = True) -> dict:
+        '''
+        Plays a full round and returns the results for each player.
+        If store is False, the game is added to the logger but not
+        written to disk (see StatisticsLogger.save_data). If keep is False,
+        the game isn't added to the logger at all.
+        '''
+
+        renderer: Renderer = self.renderer
+        crupier: Crupier = self.crupier
+        players: list[Player] = self.players
+
+        if len(self.deck) < GameEngine.MIN_CARDS_PER_ROUND \
+                or self.deck.needs_reshuffle():
+            self.deck.reset()
+        self.game_record = Game()
+        for player in players + [crupier]:
+            player.reset()
+            player.game_record = self.game_record
+        if self.recorder is not None:
+            # The AI players use a generator seeded for the round, so the
+            # round can be replayed with the same decisions.
+            round_seed: int = int(self.rng.integers(2 ** 63))
+            self.ai_player1.rng = self.ai_player2.rng = \
+                np.random.default_rng(round_seed)
+            value_counts: list[int] = self.deck.get_value_counts()
+
+        # initial render
+        for player in players:
+            renderer.render(player)
+        renderer.render(crupier, True)
+        renderer.pause(0.5)
+
+        # deal cards
+        with timings.timed('round.deal'):
+            for player in players:
+                player.add_card_to_hand()
+                renderer.render(player)
+                renderer.pause(0.5)
+                player.add_card_to_hand()
+                renderer.render(player)
+                renderer.pause(0.5)
+            crupier.add_card_to_hand()
+            renderer.render(crupier, True)
+            renderer.pause(0.5)
+            crupier.add_card_to_hand()
+            renderer.render(crupier, True)
+            renderer.pause(0.5)
+
+        # Players make their moves
+        for player in players:
+            with timings.timed(f'round.turn.{player.position}'):
+                done = False
+                while not done:
+                    if isinstance(player, HumanPlayer):
+                        renderer.start_player_turn(player)
+                        player.play_move(self.human_policy(player))
+                        renderer.end_player_turn(player)
+                    else:
+                        player.make_move()
+                    if player.is_busted():
+                        done = True
+                    if player.is_standing():
+                        done = True
+                    renderer.render(player)
+                    renderer.pause(1)
+
+        with timings.timed('round.dealer'):
+            # show cruiper's second card
+            renderer.render(crupier)
+            renderer.pause(1)
+
+            # crupier makes its move
+            done = False
+            while not done:
+                crupier.make_move()
+                if crupier.is_busted():
+                    done = True
+                if crupier.is_standing():
+                    done = True
+                renderer.render(crupier)
+                renderer.pause(1)
+
+        # determine the winner
+        for player in players:
+            renderer.render(player)
+        renderer.render(crupier)
+
+        with timings.timed('round.results'):
+            results: dict = get_results_for_players(
+                players, crupier, store, keep, self.game_record
+            )
+        if self.recorder is not None:
+            self.recorder.record_round(round_seed, value_counts, self, results)
+        renderer.game_over(results)
+        return results
+
+    def run(self, rounds: int, save: bool = True, keep: bool = True) -> None:
+        '''
+        Plays the given amount of rounds back-to-back. The games are
+        written to disk once at the end, if save is True. If keep is False,
+        the games are not kept in the logger (see play_round). The pending
+        games of the columnar store are always appended at the end.
+        '''
+
+        for _ in range(rounds):
+            self.play_round(store=False, keep=keep)
+        if save:
+            StatisticsLogger.get_logger().save_data()
+        elif StatisticsLogger.instance is not None:
+            # The last games of the columnar store, if there's one.
+            StatisticsLogger.instance.flush_columnar_store()
+
+
+def get_results_for_players(
+    players: list[Player],
+    crupier: Crupier,
+    store: bool = True,
+    keep: bool = True,
+    game_record: Game = None
+) -> dict:
+    '''
+    Determines the winner of the game based on the players' and crupier's hands.
+    Returns a dictionary with the winner and the results for each player.
+    The winners are logged in the given game record (the current game of the
+    logger if it's None), which is added to the logger.
+    If store is False, the game is not written to disk, and if keep is also
+    False, it's discarded.
+    '''
+
+    results = {}
+    croupier_wins: bool = True
+    for player in players:
+        if player.is_busted():
+            results[player.position] = 'busted'
+        elif crupier.is_busted():
+            results[player.position] = 'win'
+            croupier_wins = False
+        elif player.get_hand_value() > crupier.get_hand_value():
+            results[player.position] = 'win'
+            croupier_wins = False
+        elif player.get_hand_value() == crupier.get_hand_value():
+            results[player.position] = 'draw'
+        else:
+            results[player.position] = 'lose'
+
+    # The StatisticsLogger class understands the croupier as another player.
+    winners: list[str] = []
+    if croupier_wins:
+        winners.append('croupier')
+    else:
+        if results['ai1'] == 'win':
+            winners.append('ai1')
+        if results['ai2'] == 'win':
+            winners.append('ai2')
+        if results['player'] == 'win':
+            winners.append('human')
+
+    if not (store or keep) and game_record is not None \
+            and StatisticsLogger.instance is None:
+        # The game is discarded and there's no logger (nor columnar store)
+        # to pass it to, so the logger isn't created (and its games loaded)
+        # just for this. Useful for the training workers.
+        game_record.log_winners(winners)
+        return results
+
+    logger: StatisticsLogger = StatisticsLogger.get_logger()
+    if game_record is None:
+        logger.log_winners(winners)
+        game_dict: dict = logger.finish_current_game()
+    else:
+        game_record.log_winners(winners)
+        game_dict = logger.finish_game(game_record)
+    if store or keep:
+        logger.add_game_dict(game_dict)
+    if store:
+        logger.save_data()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays headless rounds.')
+    parser.add_argument('rounds', type=int, nargs='?', default=100)
+    parser.add_argument(
+        '--no-save', action='store_true',
+        help="don't store the games in static/games/"
+    )
+    parser.add_argument(
+        '--columnar', metavar='DIRECTORY',
+        help='store the games only in a columnar store (see columnar_store.py)'
+    )
+    parser.add_argument('--seed', type=int, help='seed of the table')
+    parser.add_argument(
+        '--penetration', type=float,
+        help='deal from a pre-shuffled shoe reshuffled at this fraction'
+    )
+    parser.add_argument(
+        '--timings', metavar='FILE',
+        help='time the phases of the rounds and write them to this file'
+    )
+    args = parser.parse_args()
+    if args.timings:
+        timings.enable()
+
+    engine: GameEngine = \
+        GameEngine(seed=args.seed, penetration=args.penetration)
+    # Without saving, the games aren't needed: the logger isn't even created,
+    # so nothing is written (not even the migration of the old games).
+    keep: bool = not args.no_save
+    if args.columnar:
+        # The logger only passes the games to the columnar store.
+        StatisticsLogger.instance = StatisticsLogger(load=False)
+        StatisticsLogger.instance.columnar_store = \
+            ColumnarGameStore(args.columnar)
+        keep = False
+    start: float = time.perf_counter()
+    engine.run(args.rounds, save=not args.no_save, keep=keep)
+    elapsed: float = time.perf_counter() - start
+    print(f'{args.rounds} rounds in {elapsed:.2f} s '
+          f'({args.rounds / elapsed:.1f} rounds/s)')
+    if args.timings:
+        timings.dump(args.timings)
@@ -1,115 +1,231 @@
-from random import choice, randint
 from .socketio_setup import socketio
-from .entities.player import AiPlayer, Crupier, Player, HumanPlayer
-from .entities.deck import Deck
-from .statistics_logger import StatisticsLogger
+from .entities.player import AiPlayer, Player, HumanPlayer
+from .entities.deck import CARDS
+from .game_engine import GameEngine, Renderer
+from .qtable_checkpoints import save_checkpoint
+from .statistics_logger import GameLog, StatisticsLogger, encode_reports
+from . import timings
+import time
 import eventlet
+from eventlet import tpool
+from eventlet.semaphore import Semaphore
 
-def test_function():
+# The qtables of the AI players are saved every this amount of rounds.
+SAVE_EVERY_ROUNDS : int = 5
+
+# Reports built at the same time, at most (see
+# build_reports_in_background). The rest of the requests wait, so a burst
+# of them doesn't take every thread of tpool nor the GIL from the tables.
+MAX_REPORT_JOBS : int = 2
+report_jobs : Semaphore = Semaphore(MAX_REPORT_JOBS)
+
+# Display data of the cards, by id. The hands only have the ids, and the web
+# page gets this table with the snapshots.
+CARDS_TABLE : list[dict] = [card.to_dict() for card in CARDS]
+
+class RoundCancelled(Exception):
+  '''
+  Raised by the WebRenderer to stop the round of a closed table.
+  '''
+
+  pass
+
+class WebRenderer(Renderer):
+  '''
+  Renders the rounds played by the GameEngine on the web page, using
+  Flask-SocketIO, and waits between events so the animations can be seen.
+  The events are only sent to the given sid or room (the table's clients).
+  Only the changes of each player are sent ('render-delta'), numbered with
+  a sequence number. A client gets the full state ('render-snapshot') when
+  it connects or when it misses a delta (see get_snapshot).
+  The server never waits for the animations: the pauses are added to the
+  next event as its 'delay' (seconds), and the browser plays the events
+  back with those delays. In turbo mode there are no delays.
+  As the browser shows the events later than they're sent, the renderer
+  keeps when it will finish showing them (see get_playback_left).
+  '''
+
+  def __init__(self, to : str = None) -> None:
+    self.to : str = to
+    # If True, the round is stopped at the next pause (see RoundCancelled).
+    self.cancelled : bool = False
+    # If True, the events are sent without delays.
+    self.turbo : bool = False
+    # Seconds the client has to wait before the next event.
+    self.delay : float = 0
+    # Number of the last delta sent.
+    self.sequence : int = 0
+    # Last state sent of each player, by position.
+    self.states : dict[str, dict] = {}
+    # time.monotonic() when the client will have shown the events sent.
+    self.playback_end : float = 0
+
+  def get_snapshot(self) -> dict:
+    '''
+    Returns the full state of the table, with the number of the last delta
+    and the table of cards.
+    '''
+
+    return {'seq': self.sequence, 'players': self.states, 'cards': CARDS_TABLE}
+
+  def get_changes(self, position : str, state : dict) -> dict:
+    '''
+    Returns the fields of the given state that changed since the last one
+    sent for the position. As the hands only grow during a round, just the
+    new cards are sent ('newCards') unless the hand was reset ('hand').
+    '''
+
+    previous : dict = self.states.get(position, {})
+    changes : dict = {
+      field: value for field, value in state.items()
+      if field not in ('position', 'hand') and previous.get(field) != value
+    }
+    hand : list[dict] = state['hand']
+    previous_hand : list[dict] = previous.get('hand')
+    if previous_hand is not None and hand[:len(previous_hand)] == previous_hand:
+      if len(hand) > len(previous_hand):
+        changes['newCards'] = hand[len(previous_hand):]
+    else:
+      changes['hand'] = hand
+    return changes
+
+  def render(self, player : Player, hide_hand : bool = False) -> None:
+    state : dict = player.get_render_data(hide_hand)
+    changes : dict = self.get_changes(player.position, state)
+    self.states[player.position] = state
+    if not changes:
+      return  # Nothing changed since the last render.
+
+    self.sequence += 1
+    self.emit('render-delta', {
+      'seq': self.sequence, 'position': player.position, 'changes': changes
+    })
+
+  def emit(self, event : str, data : dict = None) -> None:
+    '''
+    Sends the event to the table with the delay accumulated by the pauses.
+    '''
+
+    data = dict(data) if data else {}
+    data['delay'] = self.delay
+    self.playback_end = max(self.playback_end, time.monotonic()) + self.delay
+    self.delay = 0
+    socketio.emit(event, data, to=self.to)
+    eventlet.sleep(0)  # Lets the other tables play.
+
+  def get_playback_left(self) -> float:
+    '''
+    Returns the seconds the client needs to show the events already sent.
+    '''
+
+    return max(0, self.playback_end - time.monotonic())
+
+  def pause(self, seconds : float) -> None:
+    if self.cancelled:
+      raise RoundCancelled()
+    if not self.turbo:
+      self.delay += seconds
+
+  def start_player_turn(self, player : HumanPlayer) -> None:
+    self.emit('start-player-turn')
+
+  def end_player_turn(self, player : HumanPlayer) -> None:
+    self.emit('end-player-turn')
+
+  def game_over(self, results : dict) -> None:
+    self.emit('game-over', results)
+
+def wait_for_web_move(player : HumanPlayer, renderer : WebRenderer) -> str:
+  '''
+  Human policy that waits for the move sent from the web page. The buttons
+  are only enabled when the page shows the start of the turn, so the
+  player's time starts then (see WebRenderer.get_playback_left).
+  '''
+
+  return player.wait_for_player_move(renderer.get_playback_left())
+
+def compact_in_background(compact) -> None:
+  '''
+  Runs a compaction of the game log (see GameLog.compact) in a thread of
+  tpool, as it goes through many stored games.
+  '''
+
+  eventlet.spawn(tpool.execute, compact)
+
+GameLog.compaction_runner = compact_in_background
+
+# One save at a time per position (see save_qtables_in_background), so the
+# versions follow the order in which the tables asked for them.
+checkpoint_locks : dict[str, Semaphore] = {}
+
+def save_checkpoint_in_order(position : str, qtable, metadata : dict) -> None:
+  '''
+  Saves a checkpoint in a thread of tpool, after the pending saves of the
+  same position.
+  '''
+
+  with checkpoint_locks.setdefault(position, Semaphore()):
+    tpool.execute(save_checkpoint, position, qtable, metadata)
+
+def save_qtables_in_background(ai_players : list[AiPlayer]) -> None:
+  '''
+  Saves the qtables of the given players as new checkpoints. The files are
+  written in a thread of eventlet's pool (tpool), so the games don't stop.
+  '''
+
+  for ai_player in ai_players:
+    # A copy is saved, so the player can keep learning meanwhile.
+    eventlet.spawn(
+      save_checkpoint_in_order, ai_player.position,
+      ai_player.qtable.copy(), ai_player.get_checkpoint_metadata()
+    )
+
+def build_reports_in_background() -> bytes:
+  '''
+  Returns the reports of the StatisticsLogger, encoded as JSON (they're
+  sent as binary data, so Socket.IO doesn't encode them again in the hub).
+  If they aren't cached, they are built and encoded from a snapshot in a
+  thread of tpool, so the eventlet hub (and the rounds of every table)
+  keeps running meanwhile. Only the calling greenlet waits for them.
+  '''
+
+  logger : StatisticsLogger = StatisticsLogger.get_logger()
+  if logger.reports is not None:
+    return logger.reports
+
+  with report_jobs:
+    # They may have been built while this request was waiting.
+    if logger.reports is not None:
+      return logger.reports
+    snapshot : dict = logger.get_reports_snapshot()
+    reports : bytes = tpool.execute(encode_reports, snapshot)
+    logger.set_reports(reports, snapshot['generation'])
+    return reports
+
+def test_function(session, turbo : bool = False) -> None:
   '''
   This function is called when the user clicks the "Start Test" button on the web page.
   It simulates a game of blackjack, where two AI players play against the dealer (Crupier).
-  The game is played using the logic implemented in the entities and logic modules.
-  The game state is updated on the web page using Flask-Socket
-  '''
-
-  deck : Deck = Deck.getDeck()
-  crupier : Crupier = Crupier()
-  aiPlayer1 : AiPlayer = AiPlayer('ai1')
-  aiPlayer2 : AiPlayer = AiPlayer('ai2')
-  humanPlayer : HumanPlayer = HumanPlayer()
-  statsLogger : StatisticsLogger = StatisticsLogger.get_logger()
-
-  players : list[Player] = [aiPlayer1, humanPlayer ,aiPlayer2]
-
-  # initial render
-  for player in players:
-    player.renderOnWeb()
-  crupier.renderOnWeb(True)
-  eventlet.sleep(0.5)
-
-  # deal cards
-  for player in players:
-    player.add_card_to_hand()
-    player.renderOnWeb()
-    eventlet.sleep(0.5)
-    player.add_card_to_hand()
-    player.renderOnWeb()
-    eventlet.sleep(0.5)
-  crupier.add_card_to_hand()
-  crupier.renderOnWeb(True)
-  eventlet.sleep(0.5)
-  crupier.add_card_to_hand()
-  crupier.renderOnWeb(True)
-  eventlet.sleep(0.5)
-
-  # Players make their moves
-  for player in players:
-    done = False
-    while not done:
-      player.make_move()
-      if player.is_busted():
-        done = True
-      if player.is_standing():
-        done = True
-      player.renderOnWeb()
-      eventlet.sleep(1)
-
-  # show cruiper's second card
-  crupier.renderOnWeb()
-  eventlet.sleep(1)
-
-  # crupier makes its move
-  done = False
-  while not done:
-    crupier.make_move()
-    if crupier.is_busted():
-      done = True
-    if crupier.is_standing():
-      done = True
-    crupier.renderOnWeb()
-    eventlet.sleep(1)
-  
-  # determine the winner
-  for player in players:
-    player.renderOnWeb()
-  crupier.renderOnWeb()
-
-  socketio.emit('game-over', get_results_for_players(players, crupier))
-
-def get_results_for_players(players : list[Player], crupier : Crupier) -> dict:
-  '''
-  Determines the winner of the game based on the players' and crupier's hands.
-  Returns a dictionary with the winner and the results for each player.
-  '''
-  results = {}
-  croupier_wins: bool = True
-  for player in players:
-    if player.is_busted():
-      results[player.position] = 'busted'
-    elif crupier.is_busted():
-      results[player.position] = 'win'
-      croupier_wins = False
-    elif player.get_hand_value() > crupier.get_hand_value():
-      results[player.position] = 'win'
-      croupier_wins = False
-    elif player.get_hand_value() == crupier.get_hand_value():
-      results[player.position] = 'draw'
-    else:
-      results[player.position] = 'lose'
-
-  logger: StatisticsLogger = StatisticsLogger.get_logger()
-  # The StatisticsLogger class understands the croupier as another player.
-  if croupier_wins:
-    logger.log_winners(['croupier'])
-  else:
-    winners: list[str] = []
-    if results['ai1'] == 'win':
-      winners.append('ai1')
-    if results['ai2'] == 'win':
-      winners.append('ai2')
-    if results['player'] == 'win':
-      winners.append('human')
-    logger.log_winners(winners)
-  logger.store_data()
-  return results
\ No newline at end of file
+  The game is played by the GameEngine of the given TableSession (see
+  sessions.py), and the game state is updated on the web page using
+  Flask-Socket through the WebRenderer. If turbo is True, the round is
+  shown without animation delays.
+  '''
+
+  if session.playing:
+    return  # A round is already being played on this table.
+  session.playing = True
+  session.renderer.turbo = turbo
+  try:
+    with timings.timed('round'):
+      session.engine.play_round()
+  except RoundCancelled:
+    return
+  finally:
+    session.playing = False
+
+  # The AI players of each table keep learning between rounds.
+  session.rounds_played += 1
+  if session.rounds_played % SAVE_EVERY_ROUNDS == 0:
+    engine : GameEngine = session.engine
+    save_qtables_in_background([engine.ai_player1, engine.ai_player2])
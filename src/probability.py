@@ -0,0 +1,73 @@
+'''
+Exact probability calculations based on the composition of the deck.
+The composition is given as a list of counts indexed by card value, that
+is, value_counts[v] is the amount of cards of value v left in the deck
+(aces have value 11, so the list has 12 positions; 0 and 1 are unused).
+'''
+
+
+# Card values that can be found in the deck.
+CARD_VALUES: tuple[int, ...] = (2, 3, 4, 5, 6, 7, 8, 9, 10, 11)
+
+
+def hand_value(raw_total: int, aces: int) -> int:
+    '''
+    Returns the value of a hand given the sum of its cards (aces counted
+    as 11) and its amount of aces. Same rules as Player.get_hand_value.
+    '''
+
+    for _ in range(aces):
+        if raw_total <= 21:
+            break
+        raw_total -= 10
+    return raw_total
+
+
+def get_hand_state(raw_total: int, aces: int) -> tuple[int, bool]:
+    '''
+    Returns the value of a hand and if it's soft (an ace counts as 11),
+    given its raw total (aces counted as 11) and its amount of aces.
+    '''
+
+    total: int = hand_value(raw_total, aces)
+    # Each ace counted as 1 takes 10 points from the raw total.
+    soft: bool = aces > (raw_total - total) // 10
+    return total, soft
+
+
+def add_card_to_state(total: int, soft: bool, value: int) -> tuple[int, bool]:
+    '''
+    Returns the state (see get_hand_state) of a hand after adding a card of
+    the given value. Only one ace can count as 11 at the same time.
+    '''
+
+    total += value
+    if value == 11:
+        if total > 21:
+            total -= 10  # The new ace counts as 1.
+        else:
+            soft = True
+    if total > 21 and soft:
+        total -= 10
+        soft = False
+    return total, soft
+
+
+def hit_safe_probability(
+    raw_total: int, aces: int, value_counts: list[int]
+) -> float:
+    '''
+    Returns the exact probability of not getting above 21 after hitting,
+    for a hand with the given raw total (aces counted as 11) and aces.
+    '''
+
+    cards_left: int = sum(value_counts)
+    if cards_left == 0:
+        return 0.0
+
+    safe_cards: int = 0
+    for value in CARD_VALUES:
+        new_aces: int = aces + 1 if value == 11 else aces
+        if hand_value(raw_total + value, new_aces) <= 21:
+            safe_cards += value_counts[value]
+    return safe_cards / cards_left
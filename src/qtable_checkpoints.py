@@ -0,0 +1,129 @@
+'''
+Versioned checkpoints of the qtables of the AI players.
+Each save creates a new version in CHECKPOINTS_DIRECTORY/<position>/:
+<version>.npy with the qtable and <version>.json with its metadata
+(hyper-parameters and weights of the player). A version is claimed by
+creating its metadata file exclusively, so concurrent saves (threads or
+processes) never get the same version, and the qtable is written to a
+unique temporary file and then renamed, so a reader never sees half a
+checkpoint (a version is only complete with its qtable).
+The qtables are loaded memory mapped, so many processes loading the same
+checkpoint share its memory until they modify it.
+'''
+
+from typing import Any
+import json
+import os
+import tempfile
+import numpy as np
+
+
+CHECKPOINTS_DIRECTORY: str = './qtables'
+
+# Format of the checkpoints, saved in the metadata.
+CHECKPOINT_FORMAT: int = 1
+
+# Amount of versions kept per position. The oldest are deleted.
+KEEP_VERSIONS: int = 5
+
+
+def get_position_directory(position: str) -> str:
+    '''
+    Returns the directory of the checkpoints of the given position.
+    '''
+
+    return os.path.join(CHECKPOINTS_DIRECTORY, position)
+
+
+def get_versions(position: str) -> list[int]:
+    '''
+    Returns the complete versions saved for the given position, sorted.
+    '''
+
+    directory: str = get_position_directory(position)
+    if not os.path.isdir(directory):
+        return []
+    files: set[str] = set(os.listdir(directory))
+    versions: list[int] = []
+    for file in files:
+        name, extension = os.path.splitext(file)
+        if extension == '.npy' and name.isdigit() and f'{name}.json' in files:
+            versions.append(int(name))
+    return sorted(versions)
+
+
+def save_checkpoint(
+    position: str, qtable: np.ndarray, metadata: dict[str, Any]
+) -> int:
+    '''
+    Saves the qtable and metadata as a new version of the given position.
+    Returns the version saved.
+    '''
+
+    directory: str = get_position_directory(position)
+    os.makedirs(directory, exist_ok=True)
+    versions: list[int] = get_versions(position)
+    version: int = versions[-1] + 1 if versions else 1
+
+    # The metadata goes first, created exclusively: if another save took
+    # the version meanwhile, the next one is tried.
+    while True:
+        path: str = os.path.join(directory, f'{version:06d}')
+        try:
+            descriptor: int = os.open(
+                f'{path}.json', os.O_WRONLY | os.O_CREAT | os.O_EXCL
+            )
+            break
+        except FileExistsError:
+            version += 1
+
+    metadata = dict(metadata)
+    metadata['format'] = CHECKPOINT_FORMAT
+    metadata['position'] = position
+    metadata['version'] = version
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+        json.dump(metadata, file)
+
+    descriptor, temporary_path = \
+        tempfile.mkstemp(prefix=f'{version:06d}-', suffix='.tmp', dir=directory)
+    with os.fdopen(descriptor, 'wb') as file:
+        np.save(file, np.asarray(qtable))
+    os.replace(temporary_path, f'{path}.npy')
+
+    for old_version in (versions + [version])[:-KEEP_VERSIONS]:
+        old_path: str = os.path.join(directory, f'{old_version:06d}')
+        try:
+            os.remove(f'{old_path}.npy')
+            os.remove(f'{old_path}.json')
+        except OSError:
+            # It may be in use (memory mapped) in some systems.
+            pass
+    return version
+
+
+def load_checkpoint(
+    position: str, version: int = None, mmap_mode: str = 'c'
+) -> tuple[np.ndarray, dict[str, Any]] | None:
+    '''
+    Returns the qtable and metadata of the given version of the position
+    (the latest if version is None), or None if there are no checkpoints.
+    By default the qtable is mapped copy-on-write: it can be modified,
+    but the changes stay in this process. Use mmap_mode 'r' to share it
+    read-only.
+    '''
+
+    if version is None:
+        versions: list[int] = get_versions(position)
+        if len(versions) == 0:
+            return None
+        version = versions[-1]
+
+    path: str = os.path.join(get_position_directory(position), f'{version:06d}')
+    try:
+        with open(f'{path}.json', 'r', encoding='utf-8') as file:
+            metadata: dict[str, Any] = json.load(file)
+        qtable: np.ndarray = np.load(f'{path}.npy', mmap_mode=mmap_mode)
+    except (OSError, ValueError):
+        print(f'WARNING: Could not load the checkpoint {path}.')
+        return None
+    return qtable, metadata
@@ -0,0 +1,363 @@
+'''
+Compact binary log of the rounds played, with the cards dealt, and a
+replayer that plays the recorded rounds again through the same players
+(without rendering), for regression checks of the decision code and to
+benchmark it against a fixed corpus.
+File format: the header b'BJR' + format version (1 byte), then one record
+per round, prefixed by its size (uint16, little endian):
+- seed of the generator of the AI players in the round (uint64).
+- unshown cards per value (2 to 11) when the round started (10 bytes).
+- per seat (ai1, player, ai2, crupier): amount of cards (1 byte), the card
+  ids (1 byte each), amount of moves (1 byte) and the moves as bits (1 is
+  stand), 8 per byte.
+- result of ai1, player and ai2 (1 byte each, see RESULTS).
+A record takes around 45 bytes. If the app stops in the middle of a write,
+the incomplete last record is ignored.
+The AI players learn during the rounds, so a file only replays if its
+rounds were recorded in one go from the same qtables. For that reason,
+recording to a file that already has rounds needs --append.
+Usage (from the project root):
+python -m src.round_recorder record rounds.bin --rounds 10000 --seed 1
+python -m src.round_recorder replay rounds.bin
+'''
+
+from typing import Any, Iterator
+import argparse
+import os
+import struct
+import time
+import numpy as np
+from .entities.deck import CARD_VALUES_BY_ID, VALUE_CARD_IDS, Deck
+from .entities.player import HumanPlayer, Player
+from .game_engine import GameEngine, dealer_like_policy
+
+
+FORMAT_VERSION: int = 1
+HEADER: bytes = b'BJR' + bytes([FORMAT_VERSION])
+
+# Seats in the order of the records, and their entity in the game records
+# (see statistics_logger.py).
+SEATS: tuple[str, ...] = ('ai1', 'player', 'ai2', 'crupier')
+SEAT_ENTITIES: dict[str, str] = \
+    {'ai1': 'ai1', 'player': 'human', 'ai2': 'ai2', 'crupier': 'croupier'}
+RESULTS: tuple[str, ...] = ('win', 'lose', 'draw', 'busted')
+
+SIZE = struct.Struct('<H')
+SEED = struct.Struct('<Q')
+
+
+class RoundRecord:
+    '''
+    A recorded round. The hands are card ids, in the order received, and
+    the moves are 'H' (hit) or 'S' (stand), per seat.
+    '''
+
+    __slots__ = ('seed', 'value_counts', 'hands', 'moves', 'results')
+
+    def __init__(
+        self,
+        seed: int,
+        value_counts: list[int],
+        hands: dict[str, list[int]],
+        moves: dict[str, list[str]],
+        results: dict[str, str]
+    ) -> None:
+        self.seed: int = seed
+        self.value_counts: list[int] = value_counts
+        self.hands: dict[str, list[int]] = hands
+        self.moves: dict[str, list[str]] = moves
+        self.results: dict[str, str] = results
+
+    def get_cards_dealt(self) -> list[int]:
+        '''
+        Returns the cards in the order they were dealt (see
+        GameEngine.play_round): two cards per player, two to the crupier,
+        and then the hits of each seat in turn.
+        '''
+
+        cards: list[int] = []
+        for seat in SEATS:
+            cards += self.hands[seat][:2]
+        for seat in SEATS:
+            cards += self.hands[seat][2:]
+        return cards
+
+    def encode(self) -> bytes:
+        '''
+        Returns the record in the binary format (without its size).
+        '''
+
+        data: bytearray = bytearray(SEED.pack(self.seed))
+        data += bytes(self.value_counts[2:12])
+        for seat in SEATS:
+            hand: list[int] = self.hands[seat]
+            moves: list[str] = self.moves[seat]
+            data.append(len(hand))
+            data += bytes(hand)
+            data.append(len(moves))
+            bits: int = sum(1 << i for i, move in enumerate(moves) if move == 'S')
+            data += bits.to_bytes((len(moves) + 7) // 8, 'little')
+        for seat in SEATS[:3]:
+            data.append(RESULTS.index(self.results[seat]))
+        return bytes(data)
+
+    @staticmethod
+    def decode(data: bytes) -> 'RoundRecord':
+        '''
+        Returns the record in the given bytes (see encode).
+        '''
+
+        seed: int = SEED.unpack_from(data)[0]
+        position: int = SEED.size
+        value_counts: list[int] = [0, 0] + list(data[position:position + 10])
+        position += 10
+        hands: dict[str, list[int]] = {}
+        moves: dict[str, list[str]] = {}
+        for seat in SEATS:
+            cards: int = data[position]
+            hands[seat] = list(data[position + 1:position + 1 + cards])
+            position += 1 + cards
+            amount: int = data[position]
+            size: int = (amount + 7) // 8
+            bits: int = int.from_bytes(data[position + 1:position + 1 + size], 'little')
+            moves[seat] = ['S' if bits >> i & 1 else 'H' for i in range(amount)]
+            position += 1 + size
+        results: dict[str, str] = {
+            seat: RESULTS[data[position + i]] for i, seat in enumerate(SEATS[:3])
+        }
+        return RoundRecord(seed, value_counts, hands, moves, results)
+
+    @staticmethod
+    def from_engine(
+        seed: int, value_counts: list[int], engine: GameEngine, results: dict
+    ) -> 'RoundRecord':
+        '''
+        Returns the record of the round just played by the engine.
+        '''
+
+        game: dict[str, Any] = engine.game_record.to_dict()
+        seats: dict[str, Player] = {
+            'ai1': engine.ai_player1, 'player': engine.human_player,
+            'ai2': engine.ai_player2, 'crupier': engine.crupier
+        }
+        return RoundRecord(
+            seed,
+            value_counts,
+            {seat: list(player.hand) for seat, player in seats.items()},
+            {
+                seat: game[f'{SEAT_ENTITIES[seat]}_moves'][::2]
+                for seat in SEATS
+            },
+            {seat: results[seat] for seat in SEATS[:3]}
+        )
+
+
+class RoundRecorder:
+    '''
+    Writes the rounds of a GameEngine (see GameEngine.recorder) to a file.
+    The records are written in batches, so call flush when done.
+    If the file already has rounds, a FileExistsError is raised, unless
+    append is True (see the module description).
+    '''
+
+    # Records kept in memory before writing them.
+    FLUSH_EVERY: int = 1000
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        self.path: str = path
+        self.buffer: bytearray = bytearray()
+        self.pending: int = 0
+        if not os.path.exists(path) or os.path.getsize(path) <= len(HEADER):
+            with open(path, 'wb') as file:
+                file.write(HEADER)
+        elif not append:
+            raise FileExistsError(f'{path} already has recorded rounds.')
+        else:
+            with open(path, 'rb') as file:
+                if file.read(len(HEADER)) != HEADER:
+                    raise ValueError(
+                        f'{path} is not a round log of version {FORMAT_VERSION}.'
+                    )
+
+    def record_round(
+        self, seed: int, value_counts: list[int], engine: GameEngine,
+        results: dict
+    ) -> None:
+        '''
+        Records the round just played by the engine.
+        '''
+
+        data: bytes = \
+            RoundRecord.from_engine(seed, value_counts, engine, results).encode()
+        self.buffer += SIZE.pack(len(data)) + data
+        self.pending += 1
+        if self.pending >= RoundRecorder.FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        '''
+        Writes the pending records, with a single write.
+        '''
+
+        if self.pending == 0:
+            return
+        with open(self.path, 'ab') as file:
+            file.write(self.buffer)
+        self.buffer = bytearray()
+        self.pending = 0
+
+
+def read_rounds(path: str) -> Iterator[RoundRecord]:
+    '''
+    Yields the rounds recorded in the given file.
+    '''
+
+    with open(path, 'rb') as file:
+        data: bytes = file.read()
+    if data[:len(HEADER)] != HEADER:
+        raise ValueError(f'{path} is not a round log of version {FORMAT_VERSION}.')
+
+    position: int = len(HEADER)
+    while position + SIZE.size <= len(data):
+        size: int = SIZE.unpack_from(data, position)[0]
+        position += SIZE.size
+        if position + size > len(data):
+            break  # Incomplete last record.
+        yield RoundRecord.decode(data[position:position + size])
+        position += size
+
+
+class ReplayDeck(Deck):
+    '''
+    Deck that deals the cards of a recorded round, in order, starting with
+    the recorded composition (so the probabilities are the same). If the
+    players ask for more cards than recorded, random ones are dealt and the
+    round is marked as diverged.
+    '''
+
+    def __init__(
+        self, value_counts: list[int], cards: list[int],
+        rng: np.random.Generator = None
+    ) -> None:
+        super().__init__(rng)
+        self.value_counts = list(value_counts)
+        self.cards_left = sum(value_counts)
+        # The suits aren't recorded, so the copies of each value are spread
+        # among its cards. Only the random draws use them.
+        self.card_counts = [0] * len(self.card_counts)
+        for value, card_ids in enumerate(VALUE_CARD_IDS):
+            for i, card_id in enumerate(card_ids):
+                self.card_counts[card_id] = value_counts[value] // len(card_ids) \
+                    + (i < value_counts[value] % len(card_ids))
+        self.cards: list[int] = cards
+        self.cursor: int = 0
+        self.diverged: bool = False
+
+    def get_random_card(self) -> int:
+        if self.cursor < len(self.cards):
+            card_id: int = self.cards[self.cursor]
+            self.cursor += 1
+            self.remove_card(card_id)
+            return card_id
+        self.diverged = True
+        return super().get_random_card()
+
+    def remove_card(self, card_id: int) -> None:
+        self.card_counts[card_id] = max(0, self.card_counts[card_id] - 1)
+        self.value_counts[CARD_VALUES_BY_ID[card_id]] -= 1
+        self.cards_left -= 1
+
+    def reset(self) -> None:
+        '''
+        The composition of the recorded round is kept.
+        '''
+
+        pass
+
+
+def replay_rounds(path: str, engine: GameEngine = None) -> dict[str, Any]:
+    '''
+    Plays the rounds of the given file again with the engine's players (a
+    new headless engine by default), using the recorded cards, AI seeds and
+    human moves. Returns how many rounds ended with the same moves and
+    results, the diverged ones (that needed other cards) and the speed.
+    The AI players keep learning as in the recording, so with the same
+    starting qtables (checkpoints) all rounds should match.
+    '''
+
+    if engine is None:
+        engine = GameEngine()
+    rounds: int = 0
+    matching: int = 0
+    diverged: int = 0
+    mismatches: list[int] = []
+
+    start: float = time.perf_counter()
+    for index, record in enumerate(read_rounds(path)):
+        deck: ReplayDeck = ReplayDeck(
+            record.value_counts, record.get_cards_dealt(), engine.rng
+        )
+        engine.deck = deck
+        for player in engine.players + [engine.crupier]:
+            player.deck = deck
+        engine.ai_player1.rng = engine.ai_player2.rng = \
+            np.random.default_rng(record.seed)
+        human_moves: Iterator[str] = iter(record.moves['player'])
+
+        def human_policy(player: HumanPlayer) -> str:
+            move: str = next(human_moves, None)
+            if move is None:
+                deck.diverged = True
+                return dealer_like_policy(player)
+            return 'hit' if move == 'H' else 'stand'
+
+        engine.human_policy = human_policy
+        results: dict = engine.play_round(store=False, keep=False)
+
+        replayed: RoundRecord = \
+            RoundRecord.from_engine(record.seed, record.value_counts, engine, results)
+        rounds += 1
+        diverged += deck.diverged
+        if replayed.moves == record.moves and replayed.results == record.results:
+            matching += 1
+        elif len(mismatches) < 10:
+            mismatches.append(index)
+    elapsed: float = time.perf_counter() - start
+
+    return {
+        'rounds': rounds,
+        'matching': matching,
+        'diverged': diverged,
+        'first_mismatches': mismatches,
+        'rounds_per_sec': rounds / elapsed if elapsed > 0 else 0,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Records and replays rounds.')
+    parser.add_argument('command', choices=['record', 'replay'])
+    parser.add_argument('path')
+    parser.add_argument('--rounds', type=int, default=1000)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--penetration', type=float)
+    parser.add_argument(
+        '--append', action='store_true',
+        help='add the rounds to a file that already has some'
+    )
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        try:
+            recorder: RoundRecorder = RoundRecorder(args.path, args.append)
+        except FileExistsError as error:
+            parser.error(f'{error} Use --append to add rounds to it.')
+        engine: GameEngine = GameEngine(
+            seed=args.seed, penetration=args.penetration, recorder=recorder
+        )
+        for _ in range(args.rounds):
+            engine.play_round(store=False, keep=False)
+        recorder.flush()
+        print(f'{args.rounds} rounds recorded in {args.path} '
+              f'({os.path.getsize(args.path)} bytes)')
+    else:
+        print(replay_rounds(args.path))
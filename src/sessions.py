@@ -0,0 +1,105 @@
+'''
+Game sessions: every Socket.IO connection plays on its own table, with its
+own deck, players and game record, so many browsers can play at the same
+time in one process without sharing state. The finished games still go to
+the shared StatisticsLogger.
+The events of a table are only sent to its room, which the connection joins
+(see app.py), so their cost doesn't grow with the total connections.
+A table is only created when the connection starts playing, so the
+connections that just look at the page (or the reports) don't cost one.
+'''
+
+import numpy as np
+from .entities.deck import Deck, Shoe
+from .game_engine import GameEngine
+from .logic import WebRenderer, wait_for_web_move
+
+
+class TableSession:
+    '''
+    State of the table of a connection.
+    '''
+
+    def __init__(
+        self,
+        sid: str,
+        decision_timeout: float = None,
+        seed: np.random.SeedSequence = None
+    ) -> None:
+        self.sid: str = sid
+        # Room of the clients of the table.
+        self.room: str = f'table-{sid}'
+        self.renderer: WebRenderer = WebRenderer(self.room)
+        # The table has its own shoe and random generator (see GameEngine).
+        self.engine: GameEngine = GameEngine(
+            self.renderer, lambda player: wait_for_web_move(player, self.renderer),
+            seed=seed, penetration=Shoe.DEFAULT_PENETRATION
+        )
+        self.deck: Deck = self.engine.deck
+        if decision_timeout is not None:
+            self.engine.human_player.decision_timeout = decision_timeout
+        self.playing: bool = False  # True while a round is being played.
+        self.rounds_played: int = 0
+
+    def receive_move(self, move: str) -> None:
+        '''
+        Delivers a move sent by the web page to the human player.
+        '''
+
+        self.engine.human_player.receive_move(move)
+
+    def close(self) -> None:
+        '''
+        Stops the round being played, if any. The game is not logged.
+        '''
+
+        self.renderer.cancelled = True
+        # If the round is waiting for the human player, it's released.
+        self.engine.human_player.receive_move('stand')
+
+
+class SessionManager:
+    '''
+    Holds the table session of every connection, by Socket.IO sid.
+    '''
+
+    def __init__(
+        self, decision_timeout: float = None, seed: int = None
+    ) -> None:
+        self.sessions: dict[str, TableSession] = {}
+        # The seeds of the tables are spawned from this one, so the tables
+        # are independent (and repeatable if a seed is given).
+        self.seed_sequence = np.random.SeedSequence(seed)
+        # Seconds the human players have to move (see HumanPlayer).
+        self.decision_timeout: float = decision_timeout
+
+    def get_session(self, sid: str) -> TableSession:
+        '''
+        Returns the session of the given connection, creating it if needed.
+        '''
+
+        if sid not in self.sessions:
+            self.sessions[sid] = TableSession(
+                sid, self.decision_timeout, self.seed_sequence.spawn(1)[0]
+            )
+        return self.sessions[sid]
+
+    def find_session(self, sid: str) -> TableSession | None:
+        '''
+        Returns the session of the given connection, or None if it hasn't
+        played yet.
+        '''
+
+        return self.sessions.get(sid)
+
+    def close_session(self, sid: str) -> None:
+        '''
+        Stops and removes the session of the given connection, if any.
+        '''
+
+        session: TableSession = self.sessions.pop(sid, None)
+        if session is not None:
+            session.close()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
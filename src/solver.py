@@ -0,0 +1,97 @@
+'''
+Expected value of hitting and standing for a hand, given the croupier's
+showing card and the cards that haven't been seen yet.
+An expected value of 1 means always winning and -1 always losing (draws
+count as 0). Same rules as game_engine.get_results_for_players: a busted
+player always loses, and a player that doesn't bust wins if the croupier
+busts.
+The hit value assumes the best play afterwards (hitting again or standing).
+'''
+
+from .probability import CARD_VALUES, add_card_to_state, get_hand_state
+from .dealer_outcomes import OUTCOMES, get_dealer_outcomes
+
+
+# Maximum amount of entries of the transposition table. When it's full it
+# is emptied (queries of the current shoe are cheap to rebuild).
+TABLE_SIZE: int = 65536
+
+# Transposition table: (hand total, soft flag, shoe signature) -> (hit
+# value, stand value). The shoe signature is the showing card of the
+# croupier and the unseen cards per value.
+transposition_table: dict[tuple, tuple[float, float]] = {}
+
+
+def get_action_values(
+    raw_total: int, aces: int, upcard_value: int, value_counts: list[int]
+) -> tuple[float, float]:
+    '''
+    Returns the expected value of hitting and of standing for a hand with
+    the given raw total (aces counted as 11) and amount of aces. The
+    croupier's hidden card has to be included in value_counts.
+    '''
+
+    total, soft = get_hand_state(raw_total, aces)
+    signature: tuple = (upcard_value, tuple(value_counts))
+    if (total, soft, signature) in transposition_table:
+        return transposition_table[(total, soft, signature)]
+    if len(transposition_table) >= TABLE_SIZE:
+        transposition_table.clear()
+
+    cards_left: int = sum(value_counts)
+    # The croupier's cards are also taken from the same composition (see
+    # search), which is much faster than the exact distribution.
+    dealer_outcomes: tuple[float, ...] = \
+        get_dealer_outcomes(upcard_value, value_counts, exact=False)
+    bust_probability: float = dealer_outcomes[-1]
+
+    def stand_value(total: int) -> float:
+        value: float = bust_probability
+        for i in range(len(OUTCOMES) - 1):
+            dealer_total: int = 17 + i
+            if dealer_total < total:
+                value += dealer_outcomes[i]
+            elif dealer_total > total:
+                value -= dealer_outcomes[i]
+        return value
+
+    def search(total: int, soft: bool) -> tuple[float, float]:
+        # The cards drawn by the player are taken from the same composition.
+        # With a shoe of several decks the error of this is very small, and
+        # it lets every node of a query share the same signature.
+        key: tuple = (total, soft, signature)
+        if key in transposition_table:
+            return transposition_table[key]
+
+        hit: float = 0.0
+        if cards_left > 0:
+            for card_value in CARD_VALUES:
+                count: int = value_counts[card_value]
+                if count == 0:
+                    continue
+                new_total, new_soft = \
+                    add_card_to_state(total, soft, card_value)
+                if new_total > 21:
+                    best: float = -1.0
+                else:
+                    best = max(search(new_total, new_soft))
+                hit += count / cards_left * best
+        else:
+            hit = -2.0  # Hitting is impossible, so it's never chosen.
+
+        values: tuple[float, float] = (hit, stand_value(total))
+        transposition_table[key] = values
+        return values
+
+    return search(total, soft)
+
+
+def get_best_action(
+    raw_total: int, aces: int, upcard_value: int, value_counts: list[int]
+) -> int:
+    '''
+    Returns the action with the best expected value: hit (0) or stand (1).
+    '''
+
+    hit, stand = get_action_values(raw_total, aces, upcard_value, value_counts)
+    return 0 if hit > stand else 1
@@ -8,8 +8,22 @@ Players (croupier, ai1, ai2 and the human) are represented with the strings
 '''
 
 
-from typing import Any
+from typing import Any, Callable
 import json
+import os
+import tempfile
+from . import timings
+
+
+# Games stored before the append-only log existed (see GameLog.migrate).
+LEGACY_GAMES_FILE: str = './static/games.json'
+GAMES_DIRECTORY: str = './static/games'
+
+# Entities in the order used by the reports.
+ENTITIES: tuple[str, ...] = ('croupier', 'ai1', 'ai2', 'human')
+
+# Stand values encoded at once by encode_reports.
+ENCODING_CHUNK: int = 10000
 
 
 class Game:
@@ -29,15 +43,331 @@ class Game:
         self.human_moves: list[str | int] = []
         self.winners: list[str] = []
 
+    def log_move(self, entity: str, move: str, new_hand_value: int) -> None:
+        '''
+        Logs the specified move and new hand value of the specified entity.
+        '''
+
+        if new_hand_value < 0:
+            print('WARNING: Tried to log a negative hand value in log_move.')
+            return
+
+        if move not in ['H', 'S']:
+            print(f'WARNING: Unknown move found in log_move ({move}).')
+            return
+
+        match entity:
+            case 'croupier':
+                self.croupier_moves += [move, new_hand_value]
+            case 'ai1':
+                self.ai1_moves += [move, new_hand_value]
+            case 'ai2':
+                self.ai2_moves += [move, new_hand_value]
+            case 'human':
+                self.human_moves += [move, new_hand_value]
+            case _:
+                print(f'WARNING: Unknown entity found in log_move ({entity}).')
+
+    def log_winners(self, winners: list[str]) -> None:
+        '''
+        Logs the specified winners.
+        '''
+
+        for i in winners:
+            if i not in ['croupier', 'ai1', 'ai2', 'human']:
+                print(f'WARNING: Unknown entity found in log_winners ({i}).')
+                return
+        self.winners = winners
+
+    def to_dict(self) -> dict[str, Any]:
+        '''
+        Returns the game as stored by StatisticsLogger.
+        '''
+
+        return {
+            'croupier_moves': self.croupier_moves,
+            'ai1_moves': self.ai1_moves,
+            'ai2_moves': self.ai2_moves,
+            'human_moves': self.human_moves,
+            'winners': self.winners
+        }
+
+
+class GameLog:
+    '''
+    Append-only log of games, split in segments. Each segment is a JSON
+    Lines file: one game (as a dictionary) per line. Games are only ever
+    appended, with a single write per batch, so storing a game doesn't
+    depend on how many games there are. If the app crashes in the middle
+    of a write, only that last line is lost: incomplete lines are skipped
+    when reading.
+    Segments are named segment-NNNNNN.jsonl, by number, and the merged ones
+    (see compact) segment-NNNNNN-MMMMMM.jsonl, with the range they replace.
+    '''
+
+    # A new segment is started when the last one has this many games.
+    SEGMENT_MAX_GAMES: int = 10000
+    # When there are more full segments than this not merged yet, they're
+    # merged (see compact).
+    MAX_SEGMENTS: int = 8
+    # Runs the compactions, which take a while (see compact). If None, they
+    # run right away. The web app runs them in a thread, so the tables
+    # don't stop (see logic.compact_in_background).
+    compaction_runner: Callable[[Callable[[], None]], Any] = None
+
+    def __init__(self, directory: str = GAMES_DIRECTORY) -> None:
+        self.directory: str = directory
+        self.last_segment_games: int = 0  # Games in the last segment.
+        self.compacting: bool = False  # True while a compaction runs.
+
+    def get_segments(self) -> list[str]:
+        '''
+        Returns the paths of the segments, oldest first. The segments
+        replaced by a merged one are left out (they're still there if a
+        compaction was interrupted before removing them).
+        '''
+
+        if not os.path.isdir(self.directory):
+            return []
+        ranges: dict[str, tuple[int, int]] = {
+            name: self.get_segment_range(name)
+            for name in os.listdir(self.directory)
+            if name.startswith('segment-') and name.endswith('.jsonl')
+        }
+        names: list[str] = sorted(
+            (
+                name for name, (first, last) in ranges.items()
+                if not any(
+                    other_first <= first and last <= other_last
+                    and (other_first, other_last) != (first, last)
+                    for other_first, other_last in ranges.values()
+                )
+            ),
+            key=lambda name: ranges[name]
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def get_segment_path(self, number: int) -> str:
+        '''
+        Returns the path of the segment with the given number.
+        '''
+
+        return os.path.join(self.directory, f'segment-{number:06d}.jsonl')
+
+    @staticmethod
+    def get_segment_range(path: str) -> tuple[int, int]:
+        '''
+        Returns the first and last numbers of the segment in the given path
+        (the same number, unless it's a merged segment).
+        '''
+
+        name: str = os.path.basename(path)
+        first, _, last = name[len('segment-'):-len('.jsonl')].partition('-')
+        return int(first), int(last if last else first)
+
+    @staticmethod
+    def get_segment_number(path: str) -> int:
+        '''
+        Returns the number of the segment in the given path (the last one,
+        for a merged segment).
+        '''
+
+        return GameLog.get_segment_range(path)[1]
+
+    @staticmethod
+    def get_lines(games: list[dict[str, Any]]) -> str:
+        '''
+        Returns the given games as lines of the log.
+        '''
+
+        return ''.join(
+            json.dumps(game, separators=(',', ':')) + '\n' for game in games
+        )
+
+    @staticmethod
+    def read_segment(path: str) -> list[dict[str, Any]]:
+        '''
+        Returns the games of a segment, skipping incomplete lines.
+        '''
+
+        games: list[dict[str, Any]] = []
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip() == '':
+                    continue
+                try:
+                    games.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f'WARNING: Skipped a damaged game in {path}.')
+        return games
+
+    def read_games(self) -> list[dict[str, Any]]:
+        '''
+        Returns all the games of the log, oldest first.
+        '''
+
+        games: list[dict[str, Any]] = []
+        for path in self.get_segments():
+            segment_games: list[dict[str, Any]] = self.read_segment(path)
+            games += segment_games
+            self.last_segment_games = len(segment_games)
+        return games
+
+    def append_games(self, games: list[dict[str, Any]]) -> None:
+        '''
+        Appends the given games at the end of the log.
+        '''
+
+        if len(games) == 0:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        segments: list[str] = self.get_segments()
+        if len(segments) == 0:
+            path: str = self.get_segment_path(1)
+            self.last_segment_games = 0
+        elif self.last_segment_games >= GameLog.SEGMENT_MAX_GAMES:
+            path = self.get_segment_path(
+                self.get_segment_number(segments[-1]) + 1
+            )
+            self.last_segment_games = 0
+        else:
+            path = segments[-1]
+
+        # All the lines go in a single write to a file opened in append
+        # mode, so they're never mixed with other writes.
+        data: str = self.get_lines(games)
+        if not self.ends_with_newline(path):
+            # The last write was interrupted. That line is closed, so the new
+            # games don't end up in the same (damaged) line.
+            data = '\n' + data
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(data)
+        self.last_segment_games += len(games)
+
+        if not self.compacting \
+                and len(self.get_unmerged_segments()) > GameLog.MAX_SEGMENTS:
+            self.compacting = True
+            if GameLog.compaction_runner is None:
+                self.compact()
+            else:
+                GameLog.compaction_runner(self.compact)
+
+    @staticmethod
+    def ends_with_newline(path: str) -> bool:
+        '''
+        Returns True if the file is empty, doesn't exist or ends with a
+        line break.
+        '''
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return True
+        with open(path, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+
+    def get_unmerged_segments(self) -> list[str]:
+        '''
+        Returns the full segments after the last merged one, oldest first.
+        The last segment is left out, as it's still being appended to.
+        '''
+
+        segments: list[str] = []
+        for path in reversed(self.get_segments()[:-1]):
+            first, last = self.get_segment_range(path)
+            if first != last:
+                break
+            segments.insert(0, path)
+        return segments
+
+    def compact(self) -> None:
+        '''
+        Merges the full segments that weren't merged yet (see
+        get_unmerged_segments) into a single segment. Damaged lines are
+        dropped. The merged segments are never merged again, so each
+        compaction rewrites MAX_SEGMENTS segments at most, not the whole
+        history. Only the last segment is appended to meanwhile, so it can
+        run in a thread while the games are stored.
+        '''
+
+        try:
+            segments: list[str] = self.get_unmerged_segments()
+            if len(segments) >= 2:
+                self.merge_segments(segments)
+        finally:
+            self.compacting = False
+
+    def merge_segments(self, segments: list[str]) -> None:
+        '''
+        Replaces the given consecutive segments with a single one.
+        '''
+
+        # The merged segment is named after the range it replaces, so the
+        # order of the games is kept. It's written aside and then renamed:
+        # that's the only step that changes the log, since from then on the
+        # merged segment hides the others (see get_segments). If the app
+        # crashes before they're removed, no game is read twice.
+        first: int = self.get_segment_range(segments[0])[0]
+        last: int = self.get_segment_range(segments[-1])[1]
+        merged_path: str = os.path.join(
+            self.directory, f'segment-{first:06d}-{last:06d}.jsonl'
+        )
+        descriptor, temporary_path = \
+            tempfile.mkstemp(prefix='compact-', suffix='.tmp', dir=self.directory)
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            for path in segments:
+                file.write(self.get_lines(self.read_segment(path)))
+        os.replace(temporary_path, merged_path)
+
+        # The replaced segments, and any left by an interrupted compaction.
+        for name in os.listdir(self.directory):
+            if not (name.startswith('segment-') and name.endswith('.jsonl')):
+                continue
+            segment_first, segment_last = self.get_segment_range(name)
+            if first <= segment_first and segment_last <= last \
+                    and (segment_first, segment_last) != (first, last):
+                os.remove(os.path.join(self.directory, name))
+
+    def migrate(self, legacy_path: str = LEGACY_GAMES_FILE) -> int:
+        '''
+        Copies the games of the old games.json format into the log, if the
+        log is empty. Returns the amount of games migrated.
+        Many processes may try at the same time (for example, the training
+        workers), so the games are written aside and the first segment is
+        created with a hard link, which fails if it already exists: only one
+        of them migrates the games.
+        '''
+
+        if len(self.get_segments()) > 0 or not os.path.exists(legacy_path):
+            return 0
+        with open(legacy_path, 'r', encoding='utf-8') as file:
+            games: list[dict[str, Any]] = json.load(file)
+
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, temporary_path = \
+            tempfile.mkstemp(prefix='migrate-', suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                file.write(self.get_lines(games))
+            os.link(temporary_path, self.get_segment_path(1))
+        except FileExistsError:
+            return 0  # Another process migrated them.
+        finally:
+            os.remove(temporary_path)
+        self.last_segment_games = len(games)
+        return len(games)
+
 
 class StatisticsLogger:
     '''
-    Holds a record of all games and saves it to static/games.json.
+    Holds a record of all games and saves it to static/games/ (see GameLog).
     Also, offers useful statistics about the game.
     '''
 
     instance = None  # Shared instance of StatisticsLogger.
 
+    # Games are added to the columnar store in batches of this size.
+    COLUMNAR_BATCH: int = 10000
+
     @staticmethod
     def get_logger() -> 'StatisticsLogger':
         '''
@@ -49,42 +379,127 @@ class StatisticsLogger:
             StatisticsLogger.instance = StatisticsLogger()
         return StatisticsLogger.instance
 
-    def __init__(self) -> None:
+    def __init__(self, load: bool = True) -> None:
+        '''
+        If load is False, the stored games aren't loaded (nor migrated):
+        useful when the games are only passed to a columnar store.
+        '''
+
         self.games: list[dict[str, Any]] = []
         self.current_game: Game = Game()
-        self.load_data()
+        self.game_log: GameLog = GameLog()
+        self.stored_games: int = 0  # Amount of self.games already stored.
+        # Optional ColumnarGameStore (see columnar_store.py) that receives
+        # every finished game, even the discarded ones. Useful to keep many
+        # simulated games without holding them in self.games.
+        self.columnar_store = None
+        self.columnar_buffer: list[dict[str, Any]] = []
+        # Last reports built, encoded (see encode_reports). None when there
+        # are new games stored since then. The generation changes every time
+        # they're discarded, so reports built from older data aren't cached.
+        self.reports: bytes = None
+        self.reports_generation: int = 0
+        # Running counters, so the reports don't go through every game.
+        self.reset_aggregates()
+        if load:
+            self.load_data()
 
     def load_data(self) -> None:
         '''
-        Loads the content of static/games.json file to self.games.
+        Loads the stored games to self.games. The first time, the games of
+        static/games.json are migrated to the log.
         '''
 
-        with open('./static/games.json', 'r', encoding='utf-8') as file:
-            self.games = json.load(file)
+        self.game_log.migrate()
+        self.games = self.game_log.read_games()
+        self.stored_games = len(self.games)
+        self.rebuild_aggregates()
+        self.discard_reports()
 
+    @timings.timed_function('StatisticsLogger.store_data')
     def store_data(self) -> None:
         '''
-        Stores the content of self.games to static/games.json file.
+        Adds the current game to self.games and stores it.
         '''
 
         self.add_current_game()
-        with open('./static/games.json', 'w', encoding='utf-8') as file:
-            json.dump(self.games, file)
+        self.save_data()
+
+    @timings.timed_function('StatisticsLogger.save_data')
+    def save_data(self) -> None:
+        '''
+        Stores the games of self.games that aren't stored yet, without
+        adding the current game. Useful to store many games at once.
+        '''
+
+        if self.stored_games < len(self.games):
+            self.discard_reports()  # The reports change with the new games.
+        self.game_log.append_games(self.games[self.stored_games:])
+        self.stored_games = len(self.games)
+        self.flush_columnar_store()
+
+    def finish_current_game(self) -> dict[str, Any]:
+        '''
+        Returns the current game as a dictionary and starts a new one.
+        If there's a columnar store, the game is also added to it.
+        '''
+
+        game_dict: dict[str, Any] = self.finish_game(self.current_game)
+        self.current_game = Game()
+        return game_dict
+
+    def finish_game(self, game: Game) -> dict[str, Any]:
+        '''
+        Returns the given game as a dictionary. If there's a columnar store,
+        the game is also added to it.
+        '''
+
+        game_dict: dict[str, Any] = game.to_dict()
+        if self.columnar_store is not None:
+            self.columnar_buffer.append(game_dict)
+            if len(self.columnar_buffer) >= StatisticsLogger.COLUMNAR_BATCH:
+                self.flush_columnar_store()
+        return game_dict
+
+    def flush_columnar_store(self) -> None:
+        '''
+        Appends the pending games to the columnar store, if there's one.
+        '''
+
+        if self.columnar_store is not None:
+            self.columnar_store.append_games(self.columnar_buffer)
+        self.columnar_buffer = []
 
     def add_current_game(self) -> None:
         '''
         Appends the current game in the games list.
         '''
 
-        game_dict: dict[str, Any] = {
-            'croupier_moves': self.current_game.croupier_moves,
-            'ai1_moves': self.current_game.ai1_moves,
-            'ai2_moves': self.current_game.ai2_moves,
-            'human_moves': self.current_game.human_moves,
-            'winners': self.current_game.winners
-        }
+        self.add_game_dict(self.finish_current_game())
+
+    def add_game(self, game: Game) -> None:
+        '''
+        Appends the given game (for example, the one of a table) in the
+        games list.
+        '''
+
+        self.add_game_dict(self.finish_game(game))
+
+    def add_game_dict(self, game_dict: dict[str, Any]) -> None:
+        '''
+        Appends a game, already as a dictionary, in the games list.
+        '''
+
         self.games.append(game_dict)
-        self.current_game = Game()
+        self.update_aggregates(game_dict)
+
+    def discard_current_game(self) -> None:
+        '''
+        Starts a new current game without keeping the previous one (it's
+        only added to the columnar store, if there's one).
+        '''
+
+        self.finish_current_game()
 
     def log_move(self, entity: str, move: str, new_hand_value: int) -> None:
         '''
@@ -92,135 +507,238 @@ class StatisticsLogger:
         in the current game.
         '''
 
-        if new_hand_value < 0:
-            print('WARNING: Tried to log a negative hand value in log_move.')
-            return
-
-        if move not in ['H', 'S']:
-            print(f'WARNING: Unknown move found in log_move ({move}).')
-            return
-
-        match entity:
-            case 'croupier':
-                self.current_game.croupier_moves += [move, new_hand_value]
-            case 'ai1':
-                self.current_game.ai1_moves += [move, new_hand_value]
-            case 'ai2':
-                self.current_game.ai2_moves += [move, new_hand_value]
-            case 'human':
-                self.current_game.human_moves += [move, new_hand_value]
-            case _:
-                print(f'WARNING: Unknown entity found in log_move ({entity}).')
+        self.current_game.log_move(entity, move, new_hand_value)
 
     def log_winners(self, winners: list[str]) -> None:
         '''
         Logs the specified winners in the current game.
         '''
 
-        for i in winners:
-            if i not in ['croupier', 'ai1', 'ai2', 'human']:
-                print(f'WARNING: Unknown entity found in log_winners ({i}).')
-                return
-        self.current_game.winners = winners
+        self.current_game.log_winners(winners)
 
-    def get_win_percentage(self) -> list[float]:
+    def reset_aggregates(self) -> None:
         '''
-        Returns the percentage of win per player.
-        Order: Croupier, ai1, ai2, human.
+        Sets the running counters used by the reports to zero.
+        '''
+
+        # All these lists have a position per player.
+        # Order: Croupier, ai1, ai2, human.
+        self.total_wins: list[int] = [0, 0, 0, 0]
+        self.total_decisions: list[int] = [0, 0, 0, 0]
+        self.bad_decisions: list[int] = [0, 0, 0, 0]
+        # Stand value of every game, and how many times each value (0 to 31)
+        # was the stand value.
+        self.stand_values: list[list[int]] = [[], [], [], []]
+        self.stand_value_counts: list[list[int]] = \
+            [[0] * 32 for _ in ENTITIES]
+
+    def rebuild_aggregates(self) -> None:
+        '''
+        Computes the running counters from all the games in self.games.
         '''
 
-        total_games: int = len(self.games)
-        # This is needed because otherwise a division by zero will be
-        # performed at the end of the function.
-        if total_games == 0:
-            return [0, 0, 0, 0]
-        total_wins: list[float] = [0, 0, 0, 0]  # Total wins per player.
+        self.reset_aggregates()
         for game in self.games:
-            for winner in game['winners']:
-                match winner:
-                    case 'croupier':
-                        total_wins[0] += 1
-                    case 'ai1':
-                        total_wins[1] += 1
-                    case 'ai2':
-                        total_wins[2] += 1
-                    case 'human':
-                        total_wins[3] += 1
-                    case _:
-                        pass
-        return [100 * i / total_games for i in total_wins]
+            self.update_aggregates(game)
 
-    def get_success_percentage(self) -> list[float]:
+    def update_aggregates(self, game: dict[str, Any]) -> None:
         '''
-        Returns the percentage of right decisions made per player.
-        A bad decision is hitting and getting above 21 or standing bellow
-        17 (by probability, is bad to stand bellow 17). Anything else is
-        considered a good decision.
-        Order: Croupier, ai1, ai2, human.
+        Adds the given game to the running counters.
         '''
 
-        def get_bad_decisions(moves_list: list[Any]) -> int:
-            bad_decisions: int = 0
-            # A bad decision is hitting and getting above 21 or standing below
-            # 17. This loop looks for situations like that.
-            for i in range(0, len(moves_list), 2):
-                hit: bool = moves_list[i] == 'H'
-                hand_value: int = moves_list[i + 1]
-                if hit and hand_value > 21 or not hit and hand_value < 17:
-                    bad_decisions += 1
-            return bad_decisions
-
-        # Total decisions and bad decisions per player.
-        total_decisions: list[int] = [0, 0, 0, 0]
-        bad_decisions: list[int] = [0, 0, 0, 0]
+        for winner in game['winners']:
+            if winner in ENTITIES:
+                self.total_wins[ENTITIES.index(winner)] += 1
 
-        for game in self.games:
+        for i, entity in enumerate(ENTITIES):
+            moves_list: list[Any] = game[f'{entity}_moves']
             # Each moves list contains the move and the new hand value.
             # For example, game['ai1'] may contain ['H', 4, 'S', 9]. So, the
             # amount of decisions is the length of that list divided by 2.
-            total_decisions[0] += len(game['croupier_moves']) // 2
-            total_decisions[1] += len(game['ai1_moves']) // 2
-            total_decisions[2] += len(game['ai2_moves']) // 2
-            total_decisions[3] += len(game['human_moves']) // 2
-
-            bad_decisions[0] += get_bad_decisions(game['croupier_moves'])
-            bad_decisions[1] += get_bad_decisions(game['ai1_moves'])
-            bad_decisions[2] += get_bad_decisions(game['ai2_moves'])
-            bad_decisions[3] += get_bad_decisions(game['human_moves'])
-
-        if 0 in total_decisions:
-            # This is needed to prevent 0 division errors.
-            return [0, 0, 0, 0]
-
-        success_percentages: list[float] = []
-        for i in range(4):
-            # 100 * bad / total gives the percentage of bad decisions.
-            # Therefore, 100 - 100 * bad / total gives the percentage of success.
-            success_percentages.append(
-                100 - 100 * bad_decisions[i] / total_decisions[i]
-            )
-        return success_percentages
+            self.total_decisions[i] += len(moves_list) // 2
+            self.bad_decisions[i] += get_bad_decisions(moves_list)
+
+            stand_value: int = get_stand_value(moves_list)
+            self.stand_values[i].append(stand_value)
+            if 0 <= stand_value < 32:
+                self.stand_value_counts[i][stand_value] += 1
+
+    def get_win_percentage(self) -> list[float]:
+        '''
+        Returns the percentage of win per player.
+        Order: Croupier, ai1, ai2, human.
+        '''
+
+        return get_win_percentage(self.total_wins, len(self.games))
+
+    def get_success_percentage(self) -> list[float]:
+        '''
+        Returns the percentage of right decisions made per player (see
+        get_success_percentage).
+        Order: Croupier, ai1, ai2, human.
+        '''
+
+        return get_success_percentage(self.total_decisions, self.bad_decisions)
 
     def get_stand_values(self) -> list[list[int]]:
         '''
         Returns a list of stand values per player of every game.
+        The lists are the ones kept by the logger, so they shouldn't be
+        modified.
+        '''
+
+        return self.stand_values
+
+    def get_stand_value_histograms(self) -> list[list[int]]:
+        '''
+        Returns, per player, how many games ended with each stand value
+        (the position in the list is the value).
         '''
 
-        def get_stand_value(moves_list: list[Any]) -> int:
-            for i in range(0, len(moves_list), 2):
-                if moves_list[i] == 'S':
-                     return moves_list[i + 1]
-            return moves_list[-1]
+        return self.stand_value_counts
 
-        croupier_s_v: list[int] = []
-        ai1_s_v: list[int] = []
-        ai2_s_v: list[int] = []
-        human_s_v: list[int] = []
+    def discard_reports(self) -> None:
+        '''
+        Discards the cached reports, so they're built again when requested.
+        '''
 
-        for game in self.games:
-            croupier_s_v.append(get_stand_value(game['croupier_moves']))
-            ai1_s_v.append(get_stand_value(game['ai1_moves']))
-            ai2_s_v.append(get_stand_value(game['ai2_moves']))
-            human_s_v.append(get_stand_value(game['human_moves']))
+        self.reports = None
+        self.reports_generation += 1
+
+    def get_reports_snapshot(self) -> dict[str, Any]:
+        '''
+        Returns a snapshot of the data of the reports, to build them with
+        encode_reports (which can run in another thread). It's cheap: the
+        counters are copied, and the stand values lists are only appended
+        to, so their current length is kept instead of a copy.
+        '''
+
+        return {
+            'generation': self.reports_generation,
+            'total_games': len(self.games),
+            'total_wins': self.total_wins.copy(),
+            'total_decisions': self.total_decisions.copy(),
+            'bad_decisions': self.bad_decisions.copy(),
+            'stand_values': [(values, len(values)) for values in self.stand_values],
+        }
+
+    def set_reports(self, reports: bytes, generation: int) -> None:
+        '''
+        Caches the given reports, if no games were stored since the snapshot
+        of the given generation was taken.
+        '''
+
+        if generation == self.reports_generation:
+            self.reports = reports
+
+
+def get_win_percentage(total_wins: list[int], total_games: int) -> list[float]:
+    '''
+    Returns the percentage of win per player, given the wins per player.
+    '''
+
+    # This is needed because otherwise a division by zero will be
+    # performed at the end of the function.
+    if total_games == 0:
+        return [0, 0, 0, 0]
+    return [100 * i / total_games for i in total_wins]
+
+
+def get_success_percentage(
+    total_decisions: list[int], bad_decisions: list[int]
+) -> list[float]:
+    '''
+    Returns the percentage of right decisions made per player, given the
+    decisions and bad decisions per player.
+    A bad decision is hitting and getting above 21 or standing bellow
+    17 (by probability, is bad to stand bellow 17). Anything else is
+    considered a good decision.
+    '''
+
+    if 0 in total_decisions:
+        # This is needed to prevent 0 division errors.
+        return [0, 0, 0, 0]
+
+    success_percentages: list[float] = []
+    for i in range(4):
+        # 100 * bad / total gives the percentage of bad decisions.
+        # Therefore, 100 - 100 * bad / total gives the percentage of success.
+        success_percentages.append(
+            100 - 100 * bad_decisions[i] / total_decisions[i]
+        )
+    return success_percentages
+
+
+def build_reports(snapshot: dict[str, Any]) -> dict[str, Any]:
+    '''
+    Builds the reports from a snapshot of the logger (see
+    StatisticsLogger.get_reports_snapshot). It doesn't touch the logger, so
+    it can run outside the eventlet hub.
+    '''
+
+    return {
+        'win_percentages': get_win_percentage(
+            snapshot['total_wins'], snapshot['total_games']
+        ),
+        'success_percentages': get_success_percentage(
+            snapshot['total_decisions'], snapshot['bad_decisions']
+        ),
+        'stand_values': {
+            entity: values[:length]
+            for entity, (values, length) in zip(ENTITIES, snapshot['stand_values'])
+        },
+    }
+
+
+def encode_reports(snapshot: dict[str, Any]) -> bytes:
+    '''
+    Builds the reports from a snapshot (see build_reports) and returns them
+    as JSON, already encoded to send them to the web page. This goes
+    through the stand value of every game, so it's meant to run in a
+    thread. The stand values are encoded in chunks: the encoder holds the
+    GIL while it runs, so between chunks the other threads (the eventlet
+    hub) can run.
+    '''
+
+    reports: dict[str, Any] = build_reports(snapshot)
+    stand_values: dict[str, list[int]] = reports.pop('stand_values')
+    # The reports without the closing brace, and then the stand values.
+    parts: list[str] = [json.dumps(reports, separators=(',', ':'))[:-1]]
+    for i, (entity, values) in enumerate(stand_values.items()):
+        prefix: str = ',"stand_values":{' if i == 0 else ','
+        parts.append(f'{prefix}"{entity}":[')
+        parts.append(','.join(
+            json.dumps(values[start:start + ENCODING_CHUNK])[1:-1]
+            for start in range(0, len(values), ENCODING_CHUNK)
+        ))
+        parts.append(']')
+    parts.append('}}')
+    return ''.join(parts).encode()
+
+
+def get_bad_decisions(moves_list: list[Any]) -> int:
+    '''
+    Returns the amount of bad decisions in a moves list.
+    '''
+
+    bad_decisions: int = 0
+    # A bad decision is hitting and getting above 21 or standing below
+    # 17. This loop looks for situations like that.
+    for i in range(0, len(moves_list), 2):
+        hit: bool = moves_list[i] == 'H'
+        hand_value: int = moves_list[i + 1]
+        if hit and hand_value > 21 or not hit and hand_value < 17:
+            bad_decisions += 1
+    return bad_decisions
+
+
+def get_stand_value(moves_list: list[Any]) -> int:
+    '''
+    Returns the hand value of the first stand in a moves list, or the last
+    hand value if there's no stand (0 if there are no moves).
+    '''
 
-        return [croupier_s_v, ai1_s_v, ai2_s_v, human_s_v]
+    for i in range(0, len(moves_list), 2):
+        if moves_list[i] == 'S':
+            return moves_list[i + 1]
+    return moves_list[-1] if len(moves_list) > 0 else 0
@@ -0,0 +1,148 @@
+'''
+Opt-in timing instrumentation of the phases of a round (deal, turns,
+results, storing), the hit probability and the Socket.IO handlers.
+The durations are aggregated per phase in histograms with power of two
+buckets (in microseconds), so they take constant memory.
+It's disabled by default: the timed blocks then cost a global lookup.
+Enable it with the BLACKJACK_TIMINGS=1 environment variable or with
+enable(). The report can be dumped (dump) or served (see app.py /timings).
+'''
+
+from typing import Any, Callable
+from contextlib import contextmanager, nullcontext
+import functools
+import json
+import os
+import time
+
+
+# Bucket i holds the durations from 2 ** (i - 1) to 2 ** i microseconds.
+BUCKETS: int = 40
+
+enabled: bool = os.environ.get('BLACKJACK_TIMINGS', '') not in ('', '0')
+
+# Histogram of each phase (see record).
+histograms: dict[str, dict[str, Any]] = {}
+
+# Returned by timed when disabled, so nothing is measured.
+NO_TIMING = nullcontext()
+
+
+def enable(value: bool = True) -> None:
+    '''
+    Enables (or disables) the instrumentation.
+    '''
+
+    global enabled
+    enabled = value
+
+
+def reset() -> None:
+    '''
+    Forgets all the durations recorded.
+    '''
+
+    histograms.clear()
+
+
+def record(phase: str, nanoseconds: int) -> None:
+    '''
+    Adds a duration to the histogram of the phase.
+    '''
+
+    histogram: dict[str, Any] = histograms.get(phase)
+    if histogram is None:
+        histogram = histograms[phase] = {
+            'count': 0, 'total_ns': 0, 'max_ns': 0, 'buckets': [0] * BUCKETS
+        }
+    histogram['count'] += 1
+    histogram['total_ns'] += nanoseconds
+    histogram['max_ns'] = max(histogram['max_ns'], nanoseconds)
+    bucket: int = min((nanoseconds // 1000).bit_length(), BUCKETS - 1)
+    histogram['buckets'][bucket] += 1
+
+
+@contextmanager
+def measure(phase: str):
+    '''
+    Records the duration of the block in the histogram of the phase.
+    '''
+
+    start: int = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter_ns() - start)
+
+
+def timed(phase: str):
+    '''
+    Context manager that times the block as the given phase, if enabled.
+    Usage: with timings.timed('deal'): ...
+    '''
+
+    return measure(phase) if enabled else NO_TIMING
+
+
+def timed_function(phase: str) -> Callable:
+    '''
+    Decorator that times every call of the function as the given phase,
+    if enabled.
+    '''
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with measure(phase):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_percentile(buckets: list[int], count: int, percentile: float) -> int:
+    '''
+    Returns an upper bound (in microseconds) of the given percentile of the
+    histogram buckets.
+    '''
+
+    threshold: float = count * percentile / 100
+    cumulative: int = 0
+    for bucket, bucket_count in enumerate(buckets):
+        cumulative += bucket_count
+        if cumulative >= threshold:
+            return 2 ** bucket
+    return 2 ** (len(buckets) - 1)
+
+
+def get_report() -> dict[str, dict[str, Any]]:
+    '''
+    Returns, per phase, the amount of calls, the total and mean time, the
+    percentiles 50, 90 and 99 (upper bounds) and the histogram buckets.
+    '''
+
+    report: dict[str, dict[str, Any]] = {}
+    for phase, histogram in sorted(histograms.items()):
+        count: int = histogram['count']
+        buckets: list[int] = histogram['buckets']
+        report[phase] = {
+            'count': count,
+            'total_ms': histogram['total_ns'] / 1e6,
+            'mean_us': histogram['total_ns'] / count / 1000,
+            'max_us': histogram['max_ns'] / 1000,
+            'p50_us': get_percentile(buckets, count, 50),
+            'p90_us': get_percentile(buckets, count, 90),
+            'p99_us': get_percentile(buckets, count, 99),
+            'buckets': buckets,
+        }
+    return report
+
+
+def dump(path: str) -> None:
+    '''
+    Writes the report (see get_report) as JSON to the given file.
+    '''
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(get_report(), file, indent=2)
@@ -0,0 +1,156 @@
+'''
+Self-play training of the qtables of the AI players.
+Episodes (rounds played by the GameEngine) are run in a pool of processes.
+Each worker has its own deck and random seed, and every sync_every episodes
+the qtables of all workers are averaged and sent back to them.
+Training starts from the latest checkpoints (see qtable_checkpoints.py),
+unless --fresh is given, and the result is saved as new checkpoints, which
+the web game loads.
+Usage (from the project root):
+python -m src.training --episodes 100000 --workers 4
+python -m src.training --episodes 20000 --scaling
+'''
+
+from multiprocessing import Pool
+import argparse
+import os
+import time
+import numpy as np
+from .entities.player import AiPlayer
+from .game_engine import GameEngine
+from .qtable_checkpoints import (
+    CHECKPOINTS_DIRECTORY, load_checkpoint, save_checkpoint
+)
+
+
+# Positions of the AI players trained.
+POSITIONS: tuple[str, ...] = ('ai1', 'ai2')
+
+
+def run_episodes(
+    task: tuple[np.random.SeedSequence, int, list[np.ndarray]]
+) -> tuple[list[np.ndarray], int]:
+    '''
+    Runs in a worker process. Plays the given amount of episodes starting
+    from the given qtables, and returns the updated qtables.
+    The task is (seed, episodes, qtables), with a qtable per position. The
+    seed is spawned from the one of the training, so the tables of the
+    workers are independent and the training is repeatable.
+    '''
+
+    seed, episodes, qtables = task
+    engine: GameEngine = GameEngine(seed=seed)
+    ai_players: list[AiPlayer] = [engine.ai_player1, engine.ai_player2]
+    for ai_player, qtable in zip(ai_players, qtables):
+        ai_player.qtable = qtable.copy()
+
+    for _ in range(episodes):
+        engine.play_round(store=False, keep=False)
+
+    return [ai_player.qtable for ai_player in ai_players], episodes
+
+
+def train(
+    episodes: int,
+    workers: int,
+    sync_every: int = 5000,
+    seed: int = 0,
+    qtables: list[np.ndarray] = None
+) -> tuple[list[np.ndarray], float]:
+    '''
+    Trains the qtables with the given amount of episodes split among the
+    workers. Returns the trained qtables (one per position) and the
+    episodes per second reached.
+    '''
+
+    if qtables is None:
+        qtables = [np.zeros((32, 2)) for _ in POSITIONS]
+    seed_sequence = np.random.SeedSequence(seed)
+
+    start: float = time.perf_counter()
+    episodes_left: int = episodes
+    with Pool(workers) as pool:
+        while episodes_left > 0:
+            # Each worker plays up to sync_every episodes before merging.
+            batch: int = min(episodes_left, sync_every * workers)
+            per_worker: list[int] = \
+                [batch // workers + (i < batch % workers) for i in range(workers)]
+            seeds = seed_sequence.spawn(workers)
+            tasks = [
+                (child, amount, qtables)
+                for child, amount in zip(seeds, per_worker) if amount > 0
+            ]
+            results = pool.map(run_episodes, tasks)
+
+            # Merges the qtables of the workers by averaging them.
+            qtables = [
+                np.mean([result[0][i] for result in results], axis=0)
+                for i in range(len(POSITIONS))
+            ]
+            episodes_left -= batch
+    elapsed: float = time.perf_counter() - start
+
+    return qtables, episodes / elapsed
+
+
+def load_qtables() -> list[np.ndarray]:
+    '''
+    Returns the qtables of the latest checkpoints (zeros if there isn't one).
+    '''
+
+    qtables: list[np.ndarray] = []
+    for position in POSITIONS:
+        checkpoint = load_checkpoint(position, mmap_mode='r')
+        if checkpoint is None:
+            qtables.append(np.zeros((32, 2)))
+        else:
+            qtables.append(np.array(checkpoint[0]))
+    return qtables
+
+
+def save_qtables(qtables: list[np.ndarray]) -> list[int]:
+    '''
+    Saves the qtables as new checkpoints. The metadata is taken from a new
+    AI player of each position. Returns the versions saved.
+    '''
+
+    versions: list[int] = []
+    for position, qtable in zip(POSITIONS, qtables):
+        metadata: dict = AiPlayer(position).get_checkpoint_metadata()
+        metadata['trained_with'] = 'self-play'
+        versions.append(save_checkpoint(position, qtable, metadata))
+    return versions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trains the AI qtables.')
+    parser.add_argument('--episodes', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--sync-every', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--fresh', action='store_true',
+        help="start from empty qtables instead of the latest checkpoints"
+    )
+    parser.add_argument(
+        '--scaling', action='store_true',
+        help='only reports episodes/s with 1 to --workers processes'
+    )
+    args = parser.parse_args()
+
+    if args.scaling:
+        base_speed: float = 0
+        for workers in range(1, args.workers + 1):
+            _, speed = train(args.episodes, workers, args.sync_every, args.seed)
+            base_speed = base_speed if base_speed else speed
+            print(f'{workers} workers: {speed:.1f} episodes/s '
+                  f'(x{speed / base_speed:.2f})')
+    else:
+        initial_qtables = None if args.fresh else load_qtables()
+        trained_qtables, speed = train(
+            args.episodes, args.workers, args.sync_every, args.seed,
+            initial_qtables
+        )
+        versions: list[int] = save_qtables(trained_qtables)
+        print(f'{args.episodes} episodes at {speed:.1f} episodes/s, '
+              f'saved as versions {versions} in {CHECKPOINTS_DIRECTORY}')
@@ -1,5 +1,5 @@
 import Player from './player.js';
-var socket = io();
+import socket from './socket.js';
 
 // Entities
 const player = new Player('Player', Player.positions.player);
@@ -17,46 +17,104 @@ standButton.disabled = true;
 const hitSafeText = document.getElementById('hit-safe-prob');
 // hitSafeText.hidden = true;
 const reportsButton = document.getElementById('reports-button');
+const turboCheckbox = document.getElementById('turbo');
 
 socket.on('connect', function() {
   console.log('Connected to server');
 });
 
-// Updates the indicated player data and renders it
-socket.on('update-and-render', function(data) {
-  console.log('update-and-render', data);
-  const player = Player.getPlayer(data.position);
-  player.updateData(data);
-  player.render(data.hideHand);
-  if (data.position === Player.positions.player) {
-    hitSafeText.innerHTML = `${(data.hitSafeProbability * 100).toFixed(1)}% safe`;
+// Number of the last render delta received
+let lastSequence = 0;
+// True from a missed delta until the snapshot requested arrives
+let awaitingSnapshot = false;
+
+// The server sends the events of a round at once, each with the delay (in
+// seconds) to wait before showing it. They are played back in order here.
+let playback = Promise.resolve();
+
+/**
+ * Runs the action after the previous events and the given delay
+ * @param {number} delay seconds to wait, ignored in turbo mode
+ * @param {Function} action function that shows the event
+ */
+function schedule(delay, action) {
+  const milliseconds = turboCheckbox.checked ? 0 : (delay || 0) * 1000;
+  playback = playback
+    .then(() => new Promise(resolve => setTimeout(resolve, milliseconds)))
+    .then(action);
+}
+
+// Renders the indicated player, and the hit probability if it's the human player
+function renderPlayer(player) {
+  player.render(player.hideHand);
+  if (player.position === Player.positions.player) {
+    hitSafeText.innerHTML = `${(player.hitSafeProbability * 100).toFixed(1)}% safe`;
   }
+}
+
+// Full state of the table, sent on connection or when a delta was missed
+socket.on('render-snapshot', function(data) {
+  lastSequence = data.seq;
+  awaitingSnapshot = false;
+  schedule(0, () => {
+    Player.cards = data.cards;
+    for (const [position, state] of Object.entries(data.players)) {
+      const player = Player.getPlayer(position);
+      player.updateData(state);
+      renderPlayer(player);
+    }
+  });
+});
+
+// Changes of a player since the last delta
+socket.on('render-delta', function(data) {
+  if (awaitingSnapshot) {
+    // The snapshot will include this delta
+    return;
+  }
+  if (data.seq !== lastSequence + 1) {
+    // A delta was missed, so the whole state is requested again (once)
+    awaitingSnapshot = true;
+    socket.emit('request-snapshot', {});
+    return;
+  }
+  lastSequence = data.seq;
+  schedule(data.delay, () => {
+    const player = Player.getPlayer(data.position);
+    player.applyChanges(data.changes);
+    renderPlayer(player);
+  });
 });
 
 socket.on('start-player-turn', function(data) {
-  hitButton.disabled = false;
-  standButton.disabled = false;
-  // hitSafeText.hidden = false;
+  schedule(data.delay, () => {
+    hitButton.disabled = false;
+    standButton.disabled = false;
+    // hitSafeText.hidden = false;
+  });
 });
 
 socket.on('end-player-turn', function(data) {
+  // The buttons are disabled right away, so only one move is sent
   hitButton.disabled = true;
   standButton.disabled = true;
   // hitSafeText.hidden = true;
 });
 
 socket.on('game-over', function(data) {
-  startButton.disabled = false;
-  reportsButton.disabled = false;
-  for (const player of players) {
-    player.renderGameResult(data[player.position]);
-  }
+  schedule(data.delay, () => {
+    startButton.disabled = false;
+    reportsButton.disabled = false;
+    for (const player of players) {
+      player.renderGameResult(data[player.position]);
+    }
+  });
 });
 
 // This function is called when the start test button is clicked
 // It sends a message to the server to start the test
 function startTest() {
-  socket.emit('start-test', { test: 'test' });
+  socket.emit('start-test', { test: 'test', turbo: turboCheckbox.checked });
   startButton.disabled = true;
   reportsButton.disabled = true;
 }
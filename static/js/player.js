@@ -1,5 +1,7 @@
 export default class Player {
     static players = [];
+    // Display data of the cards (`{ value, filename, color }`), by card id
+    static cards = [];
     static positions = {
         player: 'player',
         crupier: 'crupier',
@@ -31,6 +33,9 @@ export default class Player {
         this.standing = false;
         this.state = 'playing';
         this.handValue = 0;
+        this.dealerOutcomes = null;
+        this.hideHand = false;
+        this.hitSafeProbability = 0;
 
         Player.players.push(this);
     }
@@ -68,9 +73,25 @@ export default class Player {
                 </div>
             </div>
             <div class="player-hand"></div>
+            ${this.renderDealerOutcomes()}
         `;
     }
 
+    /**
+     * Render the probabilities of the crupier's final hand, if available
+     * @returns {string} html of the outcomes, or an empty string
+     */
+    renderDealerOutcomes() {
+        if (!this.dealerOutcomes || Object.keys(this.dealerOutcomes).length === 0) {
+            return '';
+        }
+        const outcomes = Object.entries(this.dealerOutcomes)
+            .map(([outcome, probability]) =>
+                `<span>${outcome}: ${(probability * 100).toFixed(1)}%</span>`)
+            .join('');
+        return `<div class="dealer-outcomes">${outcomes}</div>`;
+    }
+
     /**
      * Render the player hand
      * This will render the cards in the player's hand
@@ -103,10 +124,11 @@ export default class Player {
 
     /**
      * Render a card into the player's hand
-     * @param {Object} card card object in format `{ value, filename, color }`
+     * @param {number} cardId id of the card (its position in `Player.cards`)
      * @param {boolean} hidden if the card should be rendered as hidden (the back)
      */
-    renderCard(card, hidden = false) {
+    renderCard(cardId, hidden = false) {
+        const card = Player.cards[cardId];
         const handElement = this.getPlayerElement('player-hand');
         const cardContainer = document.createElement('div');
         cardContainer.classList.add('card-container');
@@ -159,5 +181,24 @@ export default class Player {
         this.busted = data.busted;
         this.standing = data.standing;
         this.state = data.state;
+        this.dealerOutcomes = data.dealerOutcomes || null;
+        this.hideHand = data.hideHand || false;
+        this.hitSafeProbability = data.hitSafeProbability || 0;
+    }
+
+    /**
+     * Apply the changes of a `render-delta` event to the player attributes.
+     * The hand is replaced if `hand` is given, and `newCards` are appended to it
+     * @param {Object} changes changed fields, in the format of `updateData`
+     */
+    applyChanges(changes) {
+        const { hand, newCards, ...fields } = changes;
+        if (hand) {
+            this.hand = hand;
+        }
+        if (newCards) {
+            this.hand = this.hand.concat(newCards);
+        }
+        Object.assign(this, fields);
     }
 }
\ No newline at end of file
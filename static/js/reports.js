@@ -1,16 +1,25 @@
-var socket = io()
+import socket from './socket.js';
+
+// Reports received from the server (see loadReports)
+let reports;
+
+/**
+ * Requests all the reports at once. The server answers with the
+ * acknowledgement of the request, so there's no need to wait for other events.
+ * The reports come as binary data with their JSON
+ * @returns {Promise<Object>} the reports
+ */
+function loadReports() {
+    return new Promise(resolve => {
+        socket.emit('generate-reports', {}, data => {
+            reports = JSON.parse(new TextDecoder().decode(data));
+            resolve(reports);
+        });
+    });
+}
 
-async function generateWinsReport() {
-    socket.emit('generate-wins-report', {});
-    let reportData;
-    function handleResponse(data) {
-        reportData = data;
-    }
-    socket.on('receive-wins-report', handleResponse);
-    while (reportData == undefined) {
-        await new Promise(r => setTimeout(r, 100))  // Waits for 100 ms.
-    }
-    let percentages = reportData.win_percentages;
+function generateWinsReport() {
+    let percentages = reports.win_percentages;
     let winsReportData = [{
         type: 'bar',
         x: ['Croupier', 'Ai1', 'Ai2', 'Human'],
@@ -33,17 +42,8 @@ async function generateWinsReport() {
     Plotly.newPlot('wins-report', winsReportData, winsReportLayout);
 }
 
-async function generateDecisionsReport() {
-    socket.emit('generate-decisions-report', {});
-    let reportData;
-    function handleResponse(data) {
-        reportData = data;
-    }
-    socket.on('receive-decisions-report', handleResponse);
-    while (reportData == undefined) {
-        await new Promise(r => setTimeout(r, 100))  // Waits for 100 ms.
-    }
-    let percentages = reportData.success_percentages;
+function generateDecisionsReport() {
+    let percentages = reports.success_percentages;
 
     let decisionsReportData = [{
         type: 'bar',
@@ -67,21 +67,11 @@ async function generateDecisionsReport() {
     Plotly.newPlot('decisions-report', decisionsReportData, decisionsReportLayout);
 }
 
-async function generateStandReport() {
-    socket.emit('generate-stand-report', {});
-    let reportData;
-    function handleResponse(data) {
-        reportData = data;
-    }
-    socket.on('receive-stand-report', handleResponse);
-    while (reportData == undefined) {
-        await new Promise(r => setTimeout(r, 100))  // Waits for 100 ms.
-    }
-
-    let croupierStandValues = reportData.croupier;
-    let ai1StandValues = reportData.ai1;
-    let ai2StandValues = reportData.ai2;
-    let humanStandValues = reportData.human;
+function generateStandReport() {
+    let croupierStandValues = reports.stand_values.croupier;
+    let ai1StandValues = reports.stand_values.ai1;
+    let ai2StandValues = reports.stand_values.ai2;
+    let humanStandValues = reports.stand_values.human;
     let gamesIndices = Array.from({length:croupierStandValues.length}, (v,k)=>k+1);
 
     if (gamesIndices.length == 0) {
@@ -132,13 +122,15 @@ async function generateStandReport() {
 }
 
 
-function toggleReports() {
+async function toggleReports() {
     let reportsWindow = document.getElementById('reports-window');
     if (reportsWindow.style.display === '') {
         reportsWindow.style.display = 'flex';
     } else {
         reportsWindow.style.display = '';
+        return;
     }
+    await loadReports();
     showWinsReport();
 }
 window.toggleReports = toggleReports;
@@ -0,0 +1,5 @@
+// Connection shared by the scripts of the page. The server creates a table
+// per connection, so the page only opens one.
+const socket = io();
+
+export default socket;